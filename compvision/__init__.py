@@ -0,0 +1,56 @@
+"""Shared ViT embedding, similarity and transform helpers used by the scripts.
+
+Submodules are imported on first attribute access, so that e.g. analysis
+scripts reading ``compvision.results`` do not import torch, OpenCV or
+transformers.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "BACKENDS": "compvision.backends",
+    "BATCH_SIZE": "compvision.embedding",
+    "MODEL_NAME": "compvision.model",
+    "NUM_VARIATIONS": "compvision.transforms",
+    "EmbeddingCache": "compvision.cache",
+    "FastPreprocessor": "compvision.preprocess",
+    "GridSpec": "compvision.grid",
+    "OnlineStats": "compvision.stats",
+    "apply_variation": "compvision.transforms",
+    "canny_references": "compvision.canny",
+    "check_backend": "compvision.backends",
+    "collect_stats": "compvision.stats",
+    "cosine_similarity": "compvision.similarity",
+    "embed_image": "compvision.embedding",
+    "embed_images": "compvision.embedding",
+    "generate_variations": "compvision.transforms",
+    "get_backend": "compvision.backends",
+    "get_image_embedding": "compvision.embedding",
+    "get_image_embeddings": "compvision.embedding",
+    "load_grid": "compvision.grid",
+    "load_model": "compvision.model",
+    "load_similarities": "compvision.stats",
+    "nearest_references": "compvision.search",
+    "normalize": "compvision.similarity",
+    "pairwise_ttests": "compvision.stats",
+    "reference_index": "compvision.references",
+    "resize_major": "compvision.transforms",
+    "run_sweep": "compvision.sweep",
+    "save_snapshot": "compvision.model",
+    "similarity_matrix": "compvision.similarity",
+    "variation_grid": "compvision.transforms",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,208 @@
+"""Inference backends computing the CLS embedding of a batch of pixel values.
+
+- ``fp32``: the model as loaded.
+- ``bf16``: CPU autocast to bfloat16 for the matrix products.
+- ``int8``: dynamic int8 quantization of the ``Linear`` layers.
+- ``compile``: ``torch.compile`` of the forward pass.
+- ``torchscript``: the forward pass traced with ``torch.jit.trace``.
+- ``onnx``: the CLS output exported to ONNX once and run by onnxruntime
+  (optional dependency: ``pip install onnx onnxruntime``).
+
+All of them run ``ClsModel``, a truncated forward pass that stops at the CLS
+token: no pooler, no hidden-state or attention tuples, the final layer norm
+applied to the CLS token only and, optionally, an early exit after the first
+``num_layers`` encoder layers.
+
+Every backend but ``fp32`` trades some accuracy for speed; ``check_backend``
+measures the drift against ``fp32`` (see ``utils/benchmark_backends.py``).
+"""
+
+import copy
+import os
+
+import numpy as np
+import torch
+
+BACKENDS = ("fp32", "bf16", "int8", "compile", "torchscript", "onnx")
+DEFAULT_BACKEND = "fp32"
+
+ONNX_OPSET = 17
+
+# Attribute of a model holding its prepared backends. The backends reference
+# the model, so they are kept on it rather than in a table keyed by it, and
+# are collected together with it
+_PREPARED_ATTR = "_compvision_backends"
+
+# onnxruntime thread pools, None leaves the choice to onnxruntime
+_onnx_threads = {"intra_op_threads": None, "inter_op_threads": None}
+
+
+class ClsModel(torch.nn.Module):
+    """Wrap a ViT model so that it maps pixel values to the CLS embeddings.
+
+    With ``num_layers`` the embedding is read after that many encoder layers
+    (followed by the final layer norm) instead of after all of them.
+    """
+
+    def __init__(self, model, num_layers=None):
+        super().__init__()
+        self.model = model
+        # transformers 5 keeps the layers on the model, 4.x on its encoder
+        layers = model.layers if hasattr(model, "layers") else model.encoder.layer
+        self.layers = layers[:num_layers] if num_layers else layers
+
+    def forward(self, pixel_values):
+        hidden_states = self.model.embeddings(pixel_values)
+        for layer in self.layers:
+            hidden_states = layer(hidden_states)
+            if isinstance(hidden_states, tuple):
+                hidden_states = hidden_states[0]
+        return self.model.layernorm(hidden_states[:, 0, :])
+
+
+def _bf16(model, num_layers=None):
+    cls_model = ClsModel(model, num_layers)
+
+    def forward(pixel_values):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            return cls_model(pixel_values).float()
+
+    return forward
+
+
+def _int8(model, num_layers=None):
+    # The copy leaves out the backends already prepared for the original
+    prepared = getattr(model, _PREPARED_ATTR, {})
+    quantized = torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(model, {id(prepared): {}}), {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return ClsModel(quantized, num_layers)
+
+
+def _compile(model, num_layers=None):
+    return torch.compile(ClsModel(model, num_layers), dynamic=True)
+
+
+def _torchscript(model, num_layers=None):
+    example = torch.zeros(
+        (2, 3, model.config.image_size, model.config.image_size), dtype=torch.float32
+    )
+    with torch.inference_mode():
+        return torch.jit.trace(ClsModel(model, num_layers), example, strict=False)
+
+
+def onnx_path(model, num_layers=None):
+    """Default location of the ONNX export, next to the model snapshot."""
+    from compvision.model import snapshot_path
+
+    config = model.config
+    revision = getattr(config, "_commit_hash", None) or "local"
+    name = f"cls-{revision}-layers{num_layers}" if num_layers else f"cls-{revision}"
+    return os.path.join(snapshot_path(config._name_or_path), f"{name}.onnx")
+
+
+def export_onnx(model, path=None, num_layers=None):
+    """Export the CLS output of ``model`` to ONNX with a dynamic batch axis."""
+    path = path or onnx_path(model, num_layers)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    size = model.config.image_size
+    example = torch.zeros((1, 3, size, size), dtype=torch.float32)
+    with torch.inference_mode():
+        torch.onnx.export(
+            ClsModel(model, num_layers),
+            (example,),
+            path,
+            input_names=["pixel_values"],
+            output_names=["cls"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "cls": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+    return path
+
+
+def set_onnx_threads(intra_op_threads=None, inter_op_threads=None):
+    """Size the onnxruntime thread pools of the sessions created afterwards."""
+    _onnx_threads["intra_op_threads"] = intra_op_threads
+    _onnx_threads["inter_op_threads"] = inter_op_threads
+
+
+class OnnxBackend:
+    """Run the exported CLS model with onnxruntime, exporting it if needed."""
+
+    def __init__(self, model, num_layers=None, path=None):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError(
+                "The onnx backend needs onnxruntime: pip install onnx onnxruntime"
+            ) from e
+
+        path = path or onnx_path(model, num_layers)
+        if not os.path.exists(path):
+            export_onnx(model, path, num_layers)
+
+        options = onnxruntime.SessionOptions()
+        if _onnx_threads["intra_op_threads"]:
+            options.intra_op_num_threads = _onnx_threads["intra_op_threads"]
+        if _onnx_threads["inter_op_threads"]:
+            options.inter_op_num_threads = _onnx_threads["inter_op_threads"]
+        self.session = onnxruntime.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+
+    def __call__(self, pixel_values):
+        (cls,) = self.session.run(["cls"], {"pixel_values": pixel_values.numpy()})
+        return torch.from_numpy(cls)
+
+
+_FACTORIES = {
+    "fp32": ClsModel,
+    "bf16": _bf16,
+    "int8": _int8,
+    "compile": _compile,
+    "torchscript": _torchscript,
+    "onnx": OnnxBackend,
+}
+
+
+def get_backend(model, backend: str = DEFAULT_BACKEND, num_layers=None):
+    """Return a callable mapping a (B, 3, H, W) pixel tensor to (B, hidden) CLS.
+
+    Backends are prepared once per model and ``num_layers`` and reused by
+    later calls.
+    """
+    if backend not in _FACTORIES:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    if num_layers is not None and not 1 <= num_layers <= model.config.num_hidden_layers:
+        raise ValueError(
+            f"num_layers must be between 1 and {model.config.num_hidden_layers}"
+        )
+    backends = model.__dict__.setdefault(_PREPARED_ATTR, {})
+    if (backend, num_layers) not in backends:
+        backends[backend, num_layers] = _FACTORIES[backend](model, num_layers)
+    return backends[backend, num_layers]
+
+
+def check_backend(images, processor, model, backend: str, batch_size=None):
+    """Drift of ``backend`` against ``fp32`` on the given images.
+
+    Returns ``(embedding_drift, similarity_drift)``: the largest
+    ``1 - cos`` between the two embeddings of an image, and the largest
+    absolute change of the cosine similarity between two images.
+    """
+    from compvision.embedding import BATCH_SIZE, get_image_embeddings
+    from compvision.similarity import normalize
+
+    images = list(images)
+    batch_size = batch_size or BATCH_SIZE
+    reference = normalize(get_image_embeddings(images, processor, model, batch_size))
+    candidate = normalize(
+        get_image_embeddings(images, processor, model, batch_size, backend=backend)
+    )
+
+    embedding_drift = float(np.max(1.0 - np.sum(reference * candidate, axis=1)))
+    similarity_drift = float(
+        np.max(np.abs(reference @ reference.T - candidate @ candidate.T))
+    )
+    return embedding_drift, similarity_drift
@@ -0,0 +1,197 @@
+"""Persistent, content-addressed cache of CLS embeddings.
+
+Embeddings are stored as rows of a memory-mapped ``embeddings.npy`` file and
+indexed by a key derived from the image pixels, the model id/revision and the
+preprocessing configuration, so an unchanged input is never embedded twice.
+When the store is full the least recently used row is reused.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, ".embedding_cache")
+
+# Maximum number of embeddings kept on disk before LRU eviction kicks in
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def model_fingerprint(processor, model) -> str:
+    """Identify the model weights and preprocessing that produce an embedding."""
+    config = model.config
+    parts = {
+        "model": getattr(config, "_name_or_path", ""),
+        "revision": getattr(config, "_commit_hash", None),
+        "processor": processor.to_dict(),
+    }
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def image_key(fingerprint: str, image) -> str:
+    """Content hash of an RGB image (PIL image or array) under a model fingerprint."""
+    pixels = np.ascontiguousarray(np.asarray(image))
+    digest = hashlib.sha256(fingerprint.encode())
+    digest.update(f"{pixels.shape}{pixels.dtype}".encode())
+    digest.update(pixels.data)
+    return digest.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def locked(directory: str, operation=fcntl.LOCK_EX):
+    """Hold an ``flock`` (exclusive by default) of a store directory."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "a") as lock:
+        fcntl.flock(lock, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """LRU store of embeddings backed by a memory-mapped ``.npy`` matrix.
+
+    Several processes may share a cache directory: ``put`` only buffers the
+    embedding and ``save`` writes the buffered ones under an exclusive
+    ``flock`` of the directory, after re-reading the index so rows another
+    writer used since are not overwritten. Lookups re-read the index under a
+    shared lock whenever another writer has saved it.
+    """
+
+    def __init__(
+        self,
+        directory: str = DEFAULT_CACHE_DIR,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._data_path = os.path.join(directory, "embeddings.npy")
+        self._index_path = os.path.join(directory, "index.json")
+        self._data = None
+        self._index = OrderedDict()
+        # Identity of the index file last read, to notice other writers
+        self._stamp = None
+        # Embeddings put since the last save and keys read since then, whose
+        # recency is carried over to the index on save
+        self._pending = OrderedDict()
+        self._used = []
+        with locked(self.directory, fcntl.LOCK_SH):
+            self._refresh()
+
+    def _refresh(self):
+        """Re-read the store if another writer saved it; call under the lock."""
+        try:
+            info = os.stat(self._index_path)
+        except FileNotFoundError:
+            return
+        stamp = (info.st_ino, info.st_mtime_ns, info.st_size)
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+        try:
+            self._data = np.load(self._data_path, mmap_mode="r+")
+            with open(self._index_path, "r") as f:
+                self._index = OrderedDict(json.load(f))
+        except (OSError, ValueError):
+            print(f"Embedding cache at {self.directory} is unreadable, starting empty")
+            self._data = None
+            self._index = OrderedDict()
+            return
+        self.max_entries = self._data.shape[0]
+
+    def _allocate(self, dim: int):
+        # A new file replaces the old one, so other processes' maps of it
+        # stay valid until they re-read the index
+        tmp_path = self._data_path + ".tmp.npy"
+        data = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=(self.max_entries, dim)
+        )
+        data.flush()
+        del data
+        os.replace(tmp_path, self._data_path)
+        self._data = np.load(self._data_path, mmap_mode="r+")
+        self._index.clear()
+
+    def __len__(self):
+        return len(self._index) + sum(key not in self._index for key in self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending or key in self._index
+
+    def get(self, key: str):
+        """Return a copy of the cached embedding for ``key`` or None."""
+        if key in self._pending:
+            self._pending.move_to_end(key)
+            return self._pending[key].copy()
+        with locked(self.directory, fcntl.LOCK_SH):
+            self._refresh()
+            row = self._index.get(key)
+            if row is None:
+                return None
+            embedding = np.array(self._data[row])
+        self._used.append(key)
+        return embedding
+
+    def put(self, key: str, embedding: np.ndarray):
+        """Buffer an embedding until ``save`` stores it."""
+        self._pending[key] = np.array(np.ravel(embedding), dtype=np.float32)
+        self._pending.move_to_end(key)
+        if len(self._pending) >= self.max_entries:
+            self.save()
+
+    def save(self):
+        """Write the buffered embeddings and the LRU index to disk, evicting
+        the least recently used rows if full."""
+        if not self._pending and not self._used:
+            return
+        with locked(self.directory):
+            self._refresh()
+            for key in self._used:
+                if key in self._index:
+                    self._index.move_to_end(key)
+            for key, embedding in self._pending.items():
+                if self._data is None or self._data.shape[1] != embedding.shape[0]:
+                    self._allocate(embedding.shape[0])
+
+                if key in self._index:
+                    row = self._index[key]
+                    self._index.move_to_end(key)
+                elif len(self._index) < self.max_entries:
+                    row = len(self._index)
+                else:
+                    _, row = self._index.popitem(last=False)
+
+                self._data[row] = embedding
+                self._index[key] = row
+            if self._data is not None:
+                self._data.flush()
+            tmp_path = self._index_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(list(self._index.items()), f)
+            os.replace(tmp_path, self._index_path)
+            info = os.stat(self._index_path)
+            self._stamp = (info.st_ino, info.st_mtime_ns, info.st_size)
+        self._pending.clear()
+        self._used.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.save()
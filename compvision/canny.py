@@ -0,0 +1,150 @@
+"""Canny edge references of the original photos.
+
+``canny_references`` runs the edge detection of every photo of a folder in a
+thread pool and returns the references in memory, ready to be embedded. When
+an output folder is given the references are also written there, together
+with a manifest of the source files and parameters they were computed from,
+so that later runs only process photos that changed.
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+from compvision.cache import file_hash
+from compvision.pipeline import TRANSFORM_WORKERS, prefetch_map
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tiff")
+
+LOW_THRESHOLD = 100
+HIGH_THRESHOLD = 200
+KERNEL_SIZE = 3
+DILATION_ITERATIONS = 1
+
+MANIFEST_NAME = ".canny_manifest.json"
+
+
+def canny_edges(
+    gray,
+    low_threshold=LOW_THRESHOLD,
+    high_threshold=HIGH_THRESHOLD,
+    kernel_size=KERNEL_SIZE,
+    iterations=DILATION_ITERATIONS,
+):
+    """Dilated Canny edges of a grayscale image, drawn black on white."""
+    edges = cv2.Canny(gray, low_threshold, high_threshold)
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    edges = cv2.dilate(edges, kernel, iterations=iterations)
+    return cv2.bitwise_not(edges)
+
+
+def output_name(filename):
+    """Name of the reference of a photo, always a (lossless) PNG."""
+    return f"canny_{os.path.splitext(filename)[0]}.png"
+
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _is_current(entry, source_path, output_path, params):
+    """Whether ``output_path`` was computed from this source with ``params``.
+
+    The source hash is only computed when its size or mtime changed.
+    """
+    if not entry or entry["params"] != params or not os.path.exists(output_path):
+        return False
+    stat = os.stat(source_path)
+    if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+        return True
+    if entry["sha256"] != file_hash(source_path):
+        return False
+    entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+    return True
+
+
+def canny_references(
+    input_dir,
+    output_dir=None,
+    workers: int = TRANSFORM_WORKERS,
+    force=False,
+    low_threshold=LOW_THRESHOLD,
+    high_threshold=HIGH_THRESHOLD,
+    kernel_size=KERNEL_SIZE,
+    iterations=DILATION_ITERATIONS,
+):
+    """Compute the Canny reference of every photo in ``input_dir``.
+
+    Returns a dict from reference file name (``canny_<photo>.png``) to a BGR
+    array identical to what ``cv2.imread`` loads from the written file, so
+    the references can go straight to ``get_image_embeddings``, and the list
+    of the names that were computed (and written) by this call. With
+    ``output_dir`` the references are written there, and the ones whose photo
+    and parameters did not change since the last run are read back instead
+    of recomputed (unless ``force``).
+    """
+    params = {
+        "low_threshold": low_threshold,
+        "high_threshold": high_threshold,
+        "kernel_size": kernel_size,
+        "iterations": iterations,
+    }
+    manifest = {}
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+        manifest = _load_manifest(output_dir)
+
+    filenames = sorted(
+        name
+        for name in os.listdir(input_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+    def process(filename):
+        source_path = os.path.join(input_dir, filename)
+        if output_dir is not None:
+            output_path = os.path.join(output_dir, output_name(filename))
+            entry = manifest.get(filename)
+            if not force and _is_current(entry, source_path, output_path, params):
+                return filename, cv2.imread(output_path), False
+
+        gray = cv2.imread(source_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            print(f"Could not read image: {source_path}")
+            return filename, None, False
+        edges = canny_edges(gray, **params)
+        if output_dir is not None:
+            cv2.imwrite(output_path, edges)
+            stat = os.stat(source_path)
+            manifest[filename] = {
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": file_hash(source_path),
+                "params": params,
+            }
+        return filename, cv2.cvtColor(edges, cv2.COLOR_GRAY2BGR), True
+
+    references = {}
+    computed = []
+    if workers < 1:
+        results = map(process, filenames)
+    else:
+        results = prefetch_map(process, filenames, workers)
+    for filename, reference, was_computed in results:
+        if reference is not None:
+            references[output_name(filename)] = reference
+            if was_computed:
+                computed.append(output_name(filename))
+
+    if output_dir is not None:
+        with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        unchanged = len(references) - len(computed)
+        print(f"{len(computed)} Canny references computed, {unchanged} unchanged")
+    return references, computed
@@ -0,0 +1,149 @@
+"""CLS-token embeddings of images computed with the ViT model."""
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from compvision.backends import DEFAULT_BACKEND, get_backend
+from compvision.cache import image_key, model_fingerprint
+from compvision.preprocess import FastPreprocessor
+
+# Number of images sent to the model in a single forward pass
+BATCH_SIZE = 32
+
+
+def _to_pil(image):
+    """Convert an OpenCV BGR array to an RGB PIL image."""
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return image
+
+
+def _to_bgr(image):
+    """Convert a PIL image to an OpenCV BGR array."""
+    if isinstance(image, np.ndarray):
+        return image
+    return cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+
+
+def embedding_fingerprint(
+    processor,
+    model,
+    fast_preprocess: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    num_layers: int | None = None,
+) -> str:
+    """Identify everything that determines an embedding besides the image."""
+    fingerprint = model_fingerprint(processor, model)
+    if fast_preprocess:
+        fingerprint += ":fast"
+    if backend != DEFAULT_BACKEND:
+        fingerprint += f":{backend}"
+    if num_layers is not None:
+        fingerprint += f":layers{num_layers}"
+    return fingerprint
+
+
+def get_image_embeddings(
+    images,
+    processor,
+    model,
+    batch_size: int = BATCH_SIZE,
+    cache=None,
+    fast_preprocess: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    num_layers: int | None = None,
+) -> np.ndarray:
+    """Embed an iterable of images in batches, returning an (N, hidden) CLS matrix.
+
+    When an ``EmbeddingCache`` is given, images whose content was already
+    embedded by the same model are read from it instead of running the model.
+    With ``fast_preprocess`` the BGR arrays are preprocessed by
+    ``FastPreprocessor`` instead of going through PIL and the processor.
+    ``backend`` selects the inference mode (see ``compvision.backends``) and
+    ``num_layers`` reads the CLS token after that many encoder layers.
+    """
+    fingerprint = None
+    if cache is not None:
+        fingerprint = embedding_fingerprint(
+            processor, model, fast_preprocess, backend, num_layers
+        )
+    forward = get_backend(model, backend, num_layers)
+    fast = FastPreprocessor(processor) if fast_preprocess else None
+    convert = _to_bgr if fast_preprocess else _to_pil
+    embeddings = []
+    batch = []
+    batch_slots = []
+
+    def flush():
+        if fast is not None:
+            pixel_values = fast(batch)
+        else:
+            pixel_values = processor(images=batch, return_tensors="pt")["pixel_values"]
+        with torch.inference_mode():
+            cls = forward(pixel_values).numpy()
+        for (slot, key), embedding in zip(batch_slots, cls):
+            embeddings[slot] = embedding
+            if cache is not None:
+                cache.put(key, embedding)
+        batch.clear()
+        batch_slots.clear()
+
+    for image in images:
+        image = convert(image)
+        key = None
+        if cache is not None:
+            key = image_key(fingerprint, image)
+            cached = cache.get(key)
+            if cached is not None:
+                embeddings.append(cached)
+                continue
+
+        embeddings.append(None)
+        batch.append(image)
+        batch_slots.append((len(embeddings) - 1, key))
+        if len(batch) == batch_size:
+            flush()
+    if batch:
+        flush()
+    if cache is not None:
+        cache.save()
+
+    if not embeddings:
+        return np.empty((0, model.config.hidden_size), dtype=np.float32)
+    return np.stack(embeddings)
+
+
+def get_image_embedding(
+    image,
+    processor,
+    model,
+    cache=None,
+    fast_preprocess: bool = False,
+    backend: str = DEFAULT_BACKEND,
+    num_layers: int | None = None,
+) -> np.ndarray:
+    """Embed a single image (BGR array or PIL image), returning a (1, hidden) matrix."""
+    return get_image_embeddings(
+        [image],
+        processor,
+        model,
+        cache=cache,
+        fast_preprocess=fast_preprocess,
+        backend=backend,
+        num_layers=num_layers,
+    )
+
+
+def embed_images(
+    paths, processor, model, batch_size: int = BATCH_SIZE, cache=None
+) -> np.ndarray:
+    """Embed the image files at ``paths``, returning an (N, hidden) matrix."""
+    images = (Image.open(path).convert("RGB") for path in paths)
+    return get_image_embeddings(images, processor, model, batch_size, cache=cache)
+
+
+def embed_image(path: str, processor, model, cache=None) -> np.ndarray:
+    """Embed the image stored at ``path``, returning a (hidden,) vector."""
+    return embed_images([path], processor, model, cache=cache)[0]
@@ -0,0 +1,179 @@
+"""Declarative specifications of the transformation grid.
+
+A ``GridSpec`` lists the values of every axis of a sweep and how points are
+drawn from their product:
+
+- ``degree``, ``resize_percent`` and ``dilation_iter``: the transforms of
+  every sweep (see ``compvision.transforms``).
+- ``crop_percent``, ``blur_sigma`` and ``noise_std``: optional extra
+  operations, applied in that order after the dilation. Sweeps that use
+  them store one more column per operation in their results.
+- ``sampling``: ``full`` walks the whole product in sweep order, ``random``
+  draws ``samples`` distinct points uniformly and ``lhs`` draws ``samples``
+  points by Latin hypercube sampling, so every axis is covered evenly even
+  by a sparse sweep. ``limit`` caps the number of points.
+
+Specs are the presets of ``GRIDS`` or JSON files, where an axis is a list of
+values, ``{"range": [start, stop, step]}`` (stop excluded, like ``range``)
+or ``{"linspace": [start, stop, num]}``, e.g.::
+
+    {"name": "blur_smoke", "sampling": "lhs", "samples": 40,
+     "degree": {"range": [0, 361, 18]}, "blur_sigma": [0, 1, 2]}
+
+``load_grid`` accepts either.
+"""
+
+import itertools
+import json
+import os
+
+import numpy as np
+
+from compvision.transforms import DEGREES, DILATION_ITERS, RESIZE_PERCENTS
+
+AXES = ("degree", "resize_percent", "dilation_iter")
+EXTRA_OPS = ("crop_percent", "blur_sigma", "noise_std")
+SAMPLING = ("full", "random", "lhs")
+
+
+def axis_values(spec):
+    """Values of an axis given as a list, a range or a linspace (see above)."""
+    if isinstance(spec, dict):
+        if "range" in spec:
+            values = np.arange(*spec["range"])
+        elif "linspace" in spec:
+            start, stop, num = spec["linspace"]
+            values = np.linspace(start, stop, int(num))
+        else:
+            raise ValueError(f"Unknown axis specification {spec!r}")
+    else:
+        values = np.atleast_1d(spec)
+    return tuple(value.item() for value in np.asarray(values))
+
+
+class GridSpec:
+    """Axes and sampling of a transformation sweep (see the module docstring)."""
+
+    def __init__(
+        self,
+        name="dense",
+        degree=DEGREES,
+        resize_percent=RESIZE_PERCENTS,
+        dilation_iter=DILATION_ITERS,
+        crop_percent=None,
+        blur_sigma=None,
+        noise_std=None,
+        sampling="full",
+        samples=None,
+        limit=None,
+        seed=0,
+    ):
+        if sampling not in SAMPLING:
+            raise ValueError(f"Unknown sampling {sampling!r}, expected {SAMPLING}")
+        if sampling != "full" and not samples:
+            raise ValueError(f"{sampling!r} sampling needs a number of samples")
+        self.name = name
+        self.axes = {
+            "degree": axis_values(degree),
+            "resize_percent": axis_values(resize_percent),
+            "dilation_iter": tuple(int(value) for value in axis_values(dilation_iter)),
+        }
+        extras = {
+            "crop_percent": crop_percent,
+            "blur_sigma": blur_sigma,
+            "noise_std": noise_std,
+        }
+        for op, values in extras.items():
+            if values is not None:
+                self.axes[op] = axis_values(values)
+        self.sampling = sampling
+        self.samples = samples
+        self.limit = limit
+        self.seed = seed
+
+    @property
+    def extra_ops(self):
+        """Extra operations of the grid, in the order they are applied."""
+        return tuple(op for op in EXTRA_OPS if op in self.axes)
+
+    def __len__(self):
+        return len(self.points())
+
+    def points(self):
+        """Grid points as (degree, resize_percent, dilation_iter, *extras)
+        tuples, in sweep order (grouped by rotation and resize)."""
+        axes = list(self.axes.values())
+        sizes = [len(values) for values in axes]
+        total = int(np.prod(sizes))
+        rng = np.random.default_rng(self.seed)
+
+        if self.sampling == "full":
+            points = list(itertools.product(*axes))
+        else:
+            if self.sampling == "random":
+                flat = rng.choice(total, min(self.samples, total), replace=False)
+                indices = np.column_stack(np.unravel_index(flat, sizes))
+            else:
+                # One stratum of [0, 1) per sample on every axis, shuffled
+                # independently across axes
+                strata = [
+                    (rng.permutation(self.samples) + rng.random(self.samples))
+                    / self.samples
+                    for _ in axes
+                ]
+                indices = np.column_stack(
+                    [(u * size).astype(np.intp) for u, size in zip(strata, sizes)]
+                )
+            # Sorted rows are in sweep order; duplicates are dropped
+            indices = np.unique(indices, axis=0)
+            points = [
+                tuple(values[i] for values, i in zip(axes, row))
+                for row in indices.tolist()
+            ]
+        return points[: self.limit]
+
+    def to_dict(self):
+        """JSON-compatible description, the inverse of ``from_dict``."""
+        return {
+            "name": self.name,
+            **{axis: list(values) for axis, values in self.axes.items()},
+            "sampling": self.sampling,
+            "samples": self.samples,
+            "limit": self.limit,
+            "seed": self.seed,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+GRIDS = {
+    # The sweep of the players' drawings: 21 rotations x 21 resizes x 3 dilations
+    "dense": GridSpec(),
+    # The base case: 10 rotations x 10 resizes x 3 dilations, capped
+    "base_case": GridSpec(
+        "base_case",
+        degree={"linspace": [0, 360, 10]},
+        resize_percent={"linspace": [50, 150, 10]},
+        limit=1000,
+    ),
+    # A cheap sparse sweep for smoke checks
+    "smoke": GridSpec("smoke", sampling="lhs", samples=32),
+}
+
+
+def load_grid(grid="dense"):
+    """A ``GridSpec`` from a spec, a preset name of GRIDS or a JSON file path."""
+    if isinstance(grid, GridSpec):
+        return grid
+    if grid in GRIDS:
+        return GRIDS[grid]
+    if not os.path.exists(grid):
+        raise ValueError(
+            f"Unknown grid {grid!r}: expected one of {tuple(GRIDS)} or a JSON file"
+        )
+    with open(grid, "r") as f:
+        data = json.load(f)
+    data.setdefault("name", os.path.splitext(os.path.basename(grid))[0])
+    return GridSpec.from_dict(data)
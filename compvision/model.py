@@ -0,0 +1,85 @@
+"""Loading of the ViT model and its image processor.
+
+``load_model`` is a process-wide registry: the first call for a model loads
+it and every later call returns the same objects. ``transformers`` is only
+imported then, so scripts that never embed anything do not pay for it.
+
+``save_snapshot`` serializes the processor and the weights (safetensors) to
+a local directory, which ``load_model`` then prefers over the Hugging Face
+hub: no network round trip and no hub cache lookup at startup.
+"""
+
+import json
+import os
+import threading
+
+MODEL_NAME = "google/vit-base-patch16-224-in21k"
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SNAPSHOT_DIR = os.path.join(PROJECT_ROOT, ".model_snapshots")
+
+# Written next to the weights to restore the hub identity of a snapshot
+SNAPSHOT_INFO = "snapshot.json"
+
+_models = {}
+_lock = threading.Lock()
+
+
+def snapshot_path(model_name: str = MODEL_NAME, directory=DEFAULT_SNAPSHOT_DIR):
+    """Directory holding the local snapshot of ``model_name``."""
+    return os.path.join(directory, model_name.replace("/", "--"))
+
+
+def _load(model_name, snapshot_dir):
+    from transformers import ViTImageProcessor, ViTModel
+
+    path = snapshot_path(model_name, snapshot_dir) if snapshot_dir else None
+    if path and os.path.exists(os.path.join(path, SNAPSHOT_INFO)):
+        processor = ViTImageProcessor.from_pretrained(path, local_files_only=True)
+        model = ViTModel.from_pretrained(
+            path, add_pooling_layer=False, local_files_only=True
+        )
+        # Keep the hub id and revision, so that embedding cache keys and
+        # result metadata do not depend on where the weights were read from
+        with open(os.path.join(path, SNAPSHOT_INFO), "r") as f:
+            info = json.load(f)
+        model.config._name_or_path = info["model"]
+        if info["revision"] is not None:
+            model.config._commit_hash = info["revision"]
+    else:
+        processor = ViTImageProcessor.from_pretrained(model_name)
+        model = ViTModel.from_pretrained(model_name, add_pooling_layer=False)
+    model.eval()
+    return processor, model
+
+
+def load_model(model_name: str = MODEL_NAME, snapshot_dir=DEFAULT_SNAPSHOT_DIR):
+    """Return the image processor and the ViT model in inference mode.
+
+    Only the CLS token of the last hidden state is used, so the model is
+    built without its pooler.
+
+    The pair is loaded on the first call and shared by every later call in
+    the process. A snapshot written by ``save_snapshot`` under
+    ``snapshot_dir`` is used when present; pass ``snapshot_dir=None`` to
+    always go through the hub.
+    """
+    with _lock:
+        if model_name not in _models:
+            _models[model_name] = _load(model_name, snapshot_dir)
+        return _models[model_name]
+
+
+def save_snapshot(model_name: str = MODEL_NAME, directory=DEFAULT_SNAPSHOT_DIR):
+    """Serialize the processor and safetensors weights of a model for offline use."""
+    processor, model = load_model(model_name, snapshot_dir=None)
+    path = snapshot_path(model_name, directory)
+    processor.save_pretrained(path)
+    model.save_pretrained(path, safe_serialization=True)
+    info = {
+        "model": model.config._name_or_path,
+        "revision": getattr(model.config, "_commit_hash", None),
+    }
+    with open(os.path.join(path, SNAPSHOT_INFO), "w") as f:
+        json.dump(info, f, indent=2)
+    return path
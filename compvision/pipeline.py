@@ -0,0 +1,33 @@
+"""Producer/consumer helpers that overlap image transforms with inference."""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads producing transformed variants while the model runs
+TRANSFORM_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def prefetch_map(func, items, workers: int = TRANSFORM_WORKERS, max_pending=None):
+    """Yield ``func(item)`` for every item, in order, computed ahead by threads.
+
+    At most ``max_pending`` results (default: two per worker) are in flight or
+    waiting to be consumed, so memory stays bounded however many items there
+    are. OpenCV releases the GIL, so the producer threads keep transforming
+    the next variants while the consumer blocks on a model forward pass.
+    """
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,211 @@
+"""Persisted index of the embeddings of the Canny references.
+
+The index is a normalized ``(K, hidden)`` matrix of the embeddings of every
+reference in ``fotos_canny`` plus a name -> row map, stored per embedding
+fingerprint (model, preprocessing, backend) in ``.reference_index/``:
+
+- ``embeddings.npy``: the matrix, memory-mapped when loaded.
+- ``index.json``: the reference names in row order and the size, mtime and
+  hash of the file each row was computed from.
+
+``reference_index`` loads it, re-embedding only the references that were
+added or changed since it was built, so comparison jobs do not run the model
+on references.
+"""
+
+import fcntl
+import json
+import os
+
+import cv2
+import numpy as np
+
+from compvision.cache import PROJECT_ROOT, file_hash, locked
+from compvision.canny import IMAGE_EXTENSIONS
+from compvision.embedding import (
+    BATCH_SIZE,
+    embedding_fingerprint,
+    get_image_embeddings,
+)
+from compvision.search import build_search
+from compvision.similarity import normalize
+
+DEFAULT_INDEX_DIR = os.path.join(PROJECT_ROOT, ".reference_index")
+DEFAULT_CANNY_DIR = os.path.join(PROJECT_ROOT, "fotos_canny")
+
+
+def reference_name(filename: str) -> str:
+    """Drawing name of a reference file, e.g. ``canny_gato.png`` -> ``gato``."""
+    name = os.path.splitext(filename)[0]
+    return name[len("canny_") :] if name.startswith("canny_") else name
+
+
+class ReferenceIndex:
+    """Normalized reference embeddings with a name -> row map."""
+
+    def __init__(self, names, embeddings):
+        self.names = list(names)
+        self.embeddings = embeddings
+        self.rows = {name: row for row, name in enumerate(self.names)}
+        self._searchers = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    def vector(self, name) -> np.ndarray:
+        """(1, hidden) embedding of one reference."""
+        return np.asarray(self.embeddings[self.rows[name]])[np.newaxis]
+
+    def lookup(self, names) -> np.ndarray:
+        """(len(names), hidden) embeddings of the given references, in order."""
+        return np.asarray(self.embeddings[[self.rows[name] for name in names]])
+
+    def searcher(self, method: str = "exact", **options):
+        """Searcher over the embeddings (see ``compvision.search.build_search``),
+        built once per method and options and reused by later calls."""
+        key = (method, tuple(sorted(options.items())))
+        if key not in self._searchers:
+            self._searchers[key] = build_search(self.embeddings, method, **options)
+        return self._searchers[key]
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, "index.json"), "r") as f:
+            manifest = json.load(f)
+        embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None, None
+    if len(manifest["names"]) != len(embeddings):
+        return None, None
+    return manifest, embeddings
+
+
+def _load(directory, fingerprint):
+    """Manifest and embeddings of an index, empty if missing or outdated."""
+    manifest, embeddings = _read_manifest(directory)
+    if manifest is None or manifest["fingerprint"] != fingerprint:
+        return {"names": [], "sources": {}}, None
+    return manifest, embeddings
+
+
+def _stale(manifest, files):
+    """Names of ``files`` that are new or changed since ``manifest``."""
+    return [
+        name
+        for name, path in files.items()
+        if name not in manifest["names"]
+        or not _unchanged(manifest["sources"].get(name), path)
+    ]
+
+
+def _unchanged(source, path):
+    """Whether the file at ``path`` is the one ``source`` describes."""
+    if source is None:
+        return False
+    stat = os.stat(path)
+    if source["size"] != stat.st_size:
+        return False
+    return source["mtime"] == stat.st_mtime or source["sha256"] == file_hash(path)
+
+
+def reference_index(
+    processor,
+    model,
+    canny_dir=DEFAULT_CANNY_DIR,
+    index_dir=DEFAULT_INDEX_DIR,
+    cache=None,
+    batch_size: int = BATCH_SIZE,
+    fast_preprocess: bool = False,
+    backend: str = "fp32",
+    num_layers: int | None = None,
+) -> ReferenceIndex:
+    """Load the reference index of ``canny_dir``, updating it if needed.
+
+    Only the references whose file is new or changed are embedded (through
+    ``cache`` when given); the others keep their row. The index is rewritten
+    only when something changed, under an ``flock`` of its directory, so
+    parallel workers can share it.
+    """
+    fingerprint = embedding_fingerprint(
+        processor, model, fast_preprocess, backend, num_layers
+    )
+    directory = os.path.join(index_dir, fingerprint[:16])
+
+    files = {}
+    for filename in sorted(os.listdir(canny_dir)):
+        name = reference_name(filename)
+        if filename.lower().endswith(IMAGE_EXTENSIONS) and name not in files:
+            files[name] = os.path.join(canny_dir, filename)
+    names = list(files)
+
+    with locked(directory, fcntl.LOCK_SH):
+        manifest, embeddings = _load(directory, fingerprint)
+        stale = _stale(manifest, files)
+    if not stale and names == manifest["names"]:
+        return ReferenceIndex(names, embeddings)
+
+    # Parallel workers may find the index outdated at the same time: it is
+    # updated under an exclusive lock, from the index as it is then, so only
+    # the first of them embeds and writes
+    with locked(directory):
+        manifest, embeddings = _load(directory, fingerprint)
+        stale = _stale(manifest, files)
+        if not stale and names == manifest["names"]:
+            return ReferenceIndex(names, embeddings)
+        old_rows = {name: row for row, name in enumerate(manifest["names"])}
+
+        images = []
+        for name in stale:
+            image = cv2.imread(files[name])
+            if image is None:
+                raise ValueError(f"Could not read reference image {files[name]}")
+            images.append(image)
+        new_embeddings = normalize(
+            get_image_embeddings(
+                images,
+                processor,
+                model,
+                batch_size,
+                cache=cache,
+                fast_preprocess=fast_preprocess,
+                backend=backend,
+                num_layers=num_layers,
+            )
+        )
+        new_rows = {name: row for row, name in enumerate(stale)}
+
+        matrix = np.empty((len(names), model.config.hidden_size), dtype=np.float32)
+        sources = {}
+        for row, name in enumerate(names):
+            if name in new_rows:
+                matrix[row] = new_embeddings[new_rows[name]]
+            else:
+                matrix[row] = embeddings[old_rows[name]]
+            stat = os.stat(files[name])
+            previous = manifest["sources"].get(name)
+            sha256 = previous["sha256"] if name not in new_rows else None
+            sources[name] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha256": sha256 or file_hash(files[name]),
+            }
+
+        # Write both files next to the old ones and swap them in
+        data_path = os.path.join(directory, "embeddings.npy")
+        index_path = os.path.join(directory, "index.json")
+        np.save(data_path + ".tmp.npy", matrix)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(
+                {"fingerprint": fingerprint, "names": names, "sources": sources},
+                f,
+                indent=2,
+            )
+        os.replace(data_path + ".tmp.npy", data_path)
+        os.replace(index_path + ".tmp", index_path)
+        print(f"Reference index: {len(stale)} of {len(names)} references embedded")
+
+        return ReferenceIndex(names, np.load(data_path, mmap_mode="r"))
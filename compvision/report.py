@@ -0,0 +1,102 @@
+"""Parallel, cached rendering of report figures.
+
+A figure is described by a picklable payload holding everything it shows
+(precomputed histograms, box statistics, p-values, ...), so rendering needs
+no access to the result sets. ``render_figures`` fingerprints each payload,
+skips the figures whose file exists and was rendered from the same payload
+(recorded in ``.render_manifest.json`` next to the figures) and draws the
+others in worker processes with matplotlib's Agg backend.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+RENDER_MANIFEST = ".render_manifest.json"
+# Worker processes drawing figures; rendering is CPU bound
+RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+
+def payload_fingerprint(payload) -> str:
+    """sha256 of a figure payload (its pickle)."""
+    return hashlib.sha256(pickle.dumps(payload, protocol=4)).hexdigest()
+
+
+def _load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, RENDER_MANIFEST), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, RENDER_MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _init_renderer():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render(render, path, payload):
+    render(path, payload)
+    return path
+
+
+def render_figures(render, figures, output_dir, workers=RENDER_WORKERS, force=False):
+    """Render the figures whose payload changed since their last render.
+
+    ``figures`` maps output file names (inside ``output_dir``) to payloads
+    and ``render(path, payload)`` draws and saves one figure; it must be a
+    module-level function so that worker processes can import it. Returns
+    the paths of the figures rendered by this call.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+
+    pending = {}
+    for name, payload in figures.items():
+        fingerprint = payload_fingerprint(payload)
+        path = os.path.join(output_dir, name)
+        if force or manifest.get(name) != fingerprint or not os.path.exists(path):
+            pending[name] = fingerprint
+        else:
+            print(f"{path} unchanged, skipping")
+
+    rendered = []
+    if workers <= 1 or len(pending) <= 1:
+        _init_renderer()
+        for name in pending:
+            rendered.append(
+                _render(render, os.path.join(output_dir, name), figures[name])
+            )
+            manifest[name] = pending[name]
+            _save_manifest(output_dir, manifest)
+        return rendered
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(pending)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_renderer,
+    ) as executor:
+        futures = {
+            executor.submit(
+                _render, render, os.path.join(output_dir, name), figures[name]
+            ): name
+            for name in pending
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            rendered.append(future.result())
+            # Recorded as soon as it is saved, so an interrupted run keeps it
+            manifest[name] = pending[name]
+            _save_manifest(output_dir, manifest)
+    return rendered
@@ -0,0 +1,281 @@
+"""Binary, memory-mappable store of sweep results.
+
+Each result set is a pair of files sharing a path stem:
+
+- ``<stem>.bin``: fixed-size little-endian records, one per variant, holding
+  the similarity together with the (degree, resize_percent, dilation_iter)
+  that produced it, plus the values of any extra operations of the grid
+  (see ``compvision.grid``). New records are appended at the end of the
+  file.
+- ``<stem>.json``: sidecar with the record schema and the metadata shared by
+  every record (player, drawing, model id, ...).
+
+Reading maps the ``.bin`` file into memory without parsing or copying it.
+Since every record carries its grid point, an interrupted sweep can append
+the missing points later (see ``completed_points``).
+"""
+
+import json
+import os
+
+import numpy as np
+
+GRID_FIELDS = (("degree", "<f4"), ("resize_percent", "<f4"), ("dilation_iter", "<i2"))
+
+
+def record_dtype(extra_fields=()):
+    """Record layout of a sweep whose grid points also set ``extra_fields``.
+
+    The extra fields (e.g. ``blur_sigma``) are float32 columns stored between
+    the grid point and the similarity.
+    """
+    return np.dtype(
+        [
+            *GRID_FIELDS,
+            *((name, "<f4") for name in extra_fields),
+            ("similarity", "<f4"),
+        ]
+    )
+
+
+RECORD_DTYPE = record_dtype()
+
+DATA_SUFFIX = ".bin"
+SCHEMA_SUFFIX = ".json"
+# Sweep settings of result sets written before they were recorded
+METADATA_DEFAULTS = {
+    "backend": "fp32",
+    "model_resolution": False,
+    "fast_preprocess": False,
+    "num_layers": None,
+}
+# Cache of the (player, drawing) of every result set of a results directory
+RESULTS_INDEX = ".results_index.json"
+
+
+def result_path(results_dir, player, drawing, grid="dense"):
+    """Path stem of the sweep results of one player's drawing.
+
+    Sweeps over a grid other than the dense one (see ``compvision.grid``)
+    get the grid name as a suffix, so they never replace the dense results.
+    """
+    stem = f"transformation_results_{player}_{drawing}"
+    if grid != "dense":
+        stem = f"{stem}_{grid}"
+    return os.path.join(results_dir, drawing, stem)
+
+
+def make_records(grid, similarities, dtype=RECORD_DTYPE):
+    """Build result records from grid points and their similarities."""
+    fields = dtype.names[:-1]
+    grid = np.asarray(grid, dtype=np.float64).reshape(-1, len(fields))
+    records = np.empty(len(grid), dtype=dtype)
+    for column, name in enumerate(fields):
+        records[name] = grid[:, column]
+    records["similarity"] = similarities
+    return records
+
+
+def point_key(point):
+    """Hashable key of a grid point, rounded like the stored records."""
+    degree, resize_percent, dilation_iter, *extra = point
+    return (
+        float(np.float32(degree)),
+        float(np.float32(resize_percent)),
+        int(dilation_iter),
+        *(float(np.float32(value)) for value in extra),
+    )
+
+
+class Results:
+    """A result set: memory-mapped records plus their metadata."""
+
+    def __init__(self, records, metadata):
+        self.records = records
+        self.metadata = metadata
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def similarity(self):
+        return self.records["similarity"]
+
+    @property
+    def grid(self):
+        """(N, 3) array of (degree, resize_percent, dilation_iter), followed by
+        a column per extra field when the sweep had any."""
+        return np.column_stack(
+            [self.records[name] for name in self.records.dtype.names[:-1]]
+        )
+
+
+class ResultWriter:
+    """Append records to a result set, creating it if needed.
+
+    Every ``append`` is flushed and synced to disk, so it is a checkpoint: if
+    the process dies, the records appended so far can still be read.
+    """
+
+    def __init__(self, stem, metadata=None, append=False, dtype=RECORD_DTYPE):
+        self.stem = stem
+        self.dtype = dtype
+        os.makedirs(os.path.dirname(stem) or ".", exist_ok=True)
+
+        schema_path = stem + SCHEMA_SUFFIX
+        data_path = stem + DATA_SUFFIX
+        if append and has_results(stem):
+            # Records of another layout cannot be appended to
+            with open(schema_path, "r") as f:
+                fields = [tuple(field) for field in json.load(f)["fields"]]
+            append = fields == dtype.descr
+        if not append or not has_results(stem):
+            schema = {"fields": dtype.descr, **(metadata or {})}
+            with open(schema_path, "w") as f:
+                json.dump(schema, f, indent=2)
+            append = False
+
+        self._file = open(data_path, "ab" if append else "wb")
+        if append:
+            # Drop a record left half-written by an interrupted append
+            size = os.path.getsize(data_path)
+            self._file.truncate(size - size % dtype.itemsize)
+
+    def append(self, grid, similarities):
+        records = make_records(grid, similarities, self.dtype)
+        self._file.write(records.tobytes())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_results(stem, grid, similarities, metadata=None, dtype=RECORD_DTYPE):
+    """Write a whole result set at once, replacing any previous one."""
+    with ResultWriter(stem, metadata, dtype=dtype) as writer:
+        writer.append(grid, similarities)
+
+
+def has_results(stem):
+    return os.path.exists(stem + SCHEMA_SUFFIX) and os.path.exists(stem + DATA_SUFFIX)
+
+
+def read_results(stem):
+    """Memory-map a result set. A partially written last record is ignored."""
+    with open(stem + SCHEMA_SUFFIX, "r") as f:
+        metadata = json.load(f)
+    dtype = np.dtype([tuple(field) for field in metadata.pop("fields")])
+
+    count = os.path.getsize(stem + DATA_SUFFIX) // dtype.itemsize
+    if count == 0:
+        return Results(np.empty(0, dtype=dtype), metadata)
+    records = np.memmap(stem + DATA_SUFFIX, dtype=dtype, mode="r", shape=(count,))
+    return Results(records, metadata)
+
+
+def completed_points(stem, metadata=None):
+    """Keys (see ``point_key``) of the grid points already stored in a result set.
+
+    Returns an empty set when the result set does not exist, cannot be read,
+    or was written with metadata differing from ``metadata`` (e.g. another
+    model or backend), in which case the sweep has to start over. Settings
+    missing from older result sets are taken to be their METADATA_DEFAULTS.
+    """
+    try:
+        results = read_results(stem)
+    except (OSError, ValueError, KeyError):
+        return set()
+    for key, value in (metadata or {}).items():
+        if key in results.metadata:
+            stored = results.metadata[key]
+        elif key in METADATA_DEFAULTS:
+            stored = METADATA_DEFAULTS[key]
+        else:
+            continue
+        if stored != value:
+            return set()
+    return {point_key(point) for point in results.grid.tolist()}
+
+
+def _stem_labels(path, name):
+    """(player, drawing, grid name) of a result set, from its metadata or its
+    file name. Sets from before the grid was recorded are dense sweeps."""
+    try:
+        with open(path, "r") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    grid = metadata.get("grid", {}).get("name", "dense")
+    if "player" in metadata and "drawing" in metadata:
+        return metadata["player"], metadata["drawing"], grid
+    # Older result sets: transformation_results_<player>_<drawing>
+    prefix = "transformation_results_"
+    if name.startswith(prefix) and name.count("_") >= 3:
+        player, drawing = name[len(prefix) :].split("_", 1)
+        return player, drawing, grid
+    return None
+
+
+def discover_results(results_dir, grid="dense"):
+    """Find every result set of a grid under ``results_dir`` in one directory scan.
+
+    Returns a dict from ``(player, drawing)`` to the path stem of the result
+    set swept over the grid named ``grid``, sorted by key. The labels come
+    from each set's metadata; they are cached
+    in ``RESULTS_INDEX`` at the top of ``results_dir`` and only re-read for
+    sidecars whose size or mtime changed.
+    """
+    index_path = os.path.join(results_dir, RESULTS_INDEX)
+    try:
+        with open(index_path, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+
+    entries = {}
+    for directory, _, filenames in os.walk(results_dir):
+        names = set(filenames)
+        for filename in filenames:
+            stem, suffix = os.path.splitext(filename)
+            if suffix != SCHEMA_SUFFIX or stem + DATA_SUFFIX not in names:
+                continue
+            path = os.path.join(directory, filename)
+            key = os.path.relpath(os.path.join(directory, stem), results_dir)
+            stat = os.stat(path)
+            entry = cached.get(key)
+            if (
+                entry is None
+                or "grid" not in entry
+                or (entry["size"], entry["mtime"]) != (stat.st_size, stat.st_mtime)
+            ):
+                labels = _stem_labels(path, stem)
+                if labels is None:
+                    continue
+                entry = {
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "player": labels[0],
+                    "drawing": labels[1],
+                    "grid": labels[2],
+                }
+            entries[key] = entry
+
+    if entries != cached:
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(index_path + ".tmp", index_path)
+
+    return dict(
+        sorted(
+            ((entry["player"], entry["drawing"]), os.path.join(results_dir, key))
+            for key, entry in entries.items()
+            if entry["grid"] == grid
+        )
+    )
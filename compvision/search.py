@@ -0,0 +1,121 @@
+"""Nearest-reference search over normalized reference embeddings.
+
+Both searchers rank references by the cosine similarity used everywhere else
+in the project and return the top-k rows of the reference matrix:
+
+- ``ExactSearch`` scores every reference with one matrix product.
+- ``IVFSearch`` is an inverted-file index: the references are clustered with
+  spherical k-means and a query is only scored against the references of the
+  ``nprobe`` clusters whose centroids are closest to it. It trades some
+  recall for speed when there are thousands of references and needs no
+  library beyond NumPy.
+"""
+
+import numpy as np
+
+from compvision.similarity import normalize
+
+SEARCH_METHODS = ("exact", "ivf")
+
+
+def _top_k(scores, k):
+    """Columns of the k largest scores of each row, best first."""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+class ExactSearch:
+    """Brute-force cosine search over an (N, D) reference matrix."""
+
+    def __init__(self, references):
+        self.references = normalize(references)
+
+    def __len__(self):
+        return len(self.references)
+
+    def search(self, queries, k: int = 5):
+        """Return ``(similarities, rows)``, both (M, k), best match first."""
+        scores = normalize(queries) @ self.references.T
+        rows = _top_k(scores, k)
+        return np.take_along_axis(scores, rows, axis=1), rows
+
+
+class IVFSearch:
+    """Approximate cosine search with an inverted-file (IVF) index.
+
+    ``nlist`` clusters (default: about the square root of the number of
+    references) are built once; ``nprobe`` of them are searched per query.
+    """
+
+    def __init__(self, references, nlist=None, nprobe: int = 8, iterations=20, seed=0):
+        self.references = normalize(references)
+        count = len(self.references)
+        self.nlist = min(nlist or max(1, int(round(np.sqrt(count)))), count)
+        self.nprobe = min(nprobe, self.nlist)
+        self.centroids, assignment = self._cluster(iterations, seed)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(self.nlist)]
+
+    def __len__(self):
+        return len(self.references)
+
+    def _cluster(self, iterations, seed):
+        """Spherical k-means: centroids are normalized means of their members."""
+        data = self.references
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(len(data), self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            empty = ~sums.any(axis=1)
+            # Re-seed empty clusters with random references
+            sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            centroids = normalize(sums)
+        return centroids, np.argmax(data @ centroids.T, axis=1)
+
+    def search(self, queries, k: int = 5, nprobe=None):
+        """Return ``(similarities, rows)``, both (M, k), best match first.
+
+        Rows are -1 (with similarity -inf) when the probed clusters hold
+        fewer than k references.
+        """
+        queries = normalize(queries)
+        probes = _top_k(queries @ self.centroids.T, nprobe or self.nprobe)
+
+        similarities = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, (query, clusters) in enumerate(zip(queries, probes)):
+            candidates = np.concatenate([self.lists[c] for c in clusters])
+            scores = self.references[candidates] @ query
+            best = _top_k(scores[np.newaxis], k)[0]
+            similarities[i, : len(best)] = scores[best]
+            rows[i, : len(best)] = candidates[best]
+        return similarities, rows
+
+
+def build_search(references, method: str = "exact", **options):
+    """Build a searcher over ``references`` with one of SEARCH_METHODS."""
+    if method == "exact":
+        return ExactSearch(references, **options)
+    if method == "ivf":
+        return IVFSearch(references, **options)
+    raise ValueError(f"Unknown search method {method!r}, expected {SEARCH_METHODS}")
+
+
+def nearest_references(queries, index, k: int = 5, method="exact", **options):
+    """Top-k (name, similarity) matches of each query in a ``ReferenceIndex``.
+
+    The searcher is built on the first call for a method and options and
+    kept on the index, so e.g. the IVF clustering is not redone per query.
+    """
+    similarities, rows = index.searcher(method, **options).search(queries, k)
+    return [
+        [
+            (index.names[row], float(similarity))
+            for row, similarity in zip(query_rows, query_similarities)
+            if row >= 0
+        ]
+        for query_rows, query_similarities in zip(rows, similarities)
+    ]
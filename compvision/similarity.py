@@ -0,0 +1,42 @@
+"""Cosine similarity between embeddings."""
+
+import numpy as np
+
+
+def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
+    """Cosine similarity between two embeddings of any matching size."""
+    vec1 = np.ravel(vec1)
+    vec2 = np.ravel(vec2)
+    norm1 = np.linalg.norm(vec1)
+    norm2 = np.linalg.norm(vec2)
+    if norm1 == 0 or norm2 == 0:
+        return 0.0
+    return float(np.dot(vec1, vec2) / (norm1 * norm2))
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of an (N, D) matrix, leaving zero rows at zero."""
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms != 0)
+
+
+def similarity_matrix(
+    queries: np.ndarray, references: np.ndarray, chunk_size: int | None = None
+) -> np.ndarray:
+    """Cosine similarities between every query (M, D) and reference (N, D) row.
+
+    Both sides are normalized once and the (M, N) result comes from a single
+    matrix product. With ``chunk_size`` the queries are processed that many
+    rows at a time so temporaries stay bounded for very large M.
+    """
+    references = normalize(references)
+    queries = np.atleast_2d(queries)
+    if chunk_size is None or chunk_size >= len(queries):
+        return normalize(queries) @ references.T
+
+    result = np.empty((len(queries), len(references)), dtype=np.float32)
+    for start in range(0, len(queries), chunk_size):
+        stop = start + chunk_size
+        result[start:stop] = normalize(queries[start:stop]) @ references.T
+    return result
@@ -0,0 +1,371 @@
+"""Vectorized and streaming statistics over the sweep results.
+
+``load_similarities`` stacks the result sets into one ``(players, drawings,
+variants)`` array, NaN-padded where a set is missing or shorter.
+``pairwise_ttests`` then runs the t-test of every pair of players on every
+drawing at once, from per-(player, drawing) moments, and returns one tidy
+table with effect sizes and multiple-comparison corrections.
+
+When the result sets are too large to hold, ``collect_stats`` reads each one
+in chunks into an ``OnlineStats`` accumulator (count, mean and variance with
+Welford/Chan updates, min, max and a t-digest for quantiles) and
+``stats_ttests`` builds the same table from the accumulated moments.
+Accumulators of different chunks or shards of a result set can be merged.
+"""
+
+import numpy as np
+
+from compvision.results import read_results, result_path
+
+# Records read per chunk by the streaming statistics
+CHUNK_SIZE = 1 << 16
+# t-digest compression: about compression / 2 centroids are kept
+DIGEST_COMPRESSION = 500
+# Values kept exactly before the t-digest starts merging them
+DIGEST_BUFFER = 4096
+
+
+def _compress(means, weights, compression):
+    """Merge sorted-by-mean centroids into t-digest clusters.
+
+    Clusters span at most one unit of the arcsine scale function
+    ``k(q) = compression / (2 pi) * asin(2q - 1)``, so they are small near
+    the tails and larger around the median.
+    """
+    order = np.argsort(means, kind="stable")
+    means, weights = means[order], weights[order]
+    cumulative = np.cumsum(weights)
+    q = (cumulative - weights / 2) / cumulative[-1]
+    k = compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+    # k is non-decreasing, so every cluster is a contiguous run of centroids
+    cluster = (np.floor(k) - np.floor(k[0])).astype(np.intp)
+    cluster_weights = np.bincount(cluster, weights)
+    cluster_means = np.bincount(cluster, weights * means)
+    kept = cluster_weights > 0
+    return cluster_means[kept] / cluster_weights[kept], cluster_weights[kept]
+
+
+class OnlineStats:
+    """Mergeable summary of a stream of values.
+
+    ``update`` adds a chunk of values (NaN are ignored) and ``merge`` adds
+    another accumulator, e.g. one computed on another shard; both return the
+    accumulator. Mean and variance are exact up to rounding; quantiles are
+    exact up to DIGEST_BUFFER values and then come from a t-digest.
+    """
+
+    def __init__(self, compression=DIGEST_COMPRESSION):
+        self.compression = compression
+        self.count = 0
+        self.mean = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._m2 = 0.0
+        self._centroids = np.empty(0)
+        self._weights = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        mean = values.mean()
+        return self._combine(
+            len(values),
+            mean,
+            ((values - mean) ** 2).sum(),
+            values.min(),
+            values.max(),
+            values,
+            np.ones(len(values)),
+        )
+
+    def merge(self, other):
+        if not other.count:
+            return self
+        return self._combine(
+            other.count,
+            other.mean,
+            other._m2,
+            other.min,
+            other.max,
+            other._centroids,
+            other._weights,
+        )
+
+    def _combine(self, count, mean, m2, minimum, maximum, centroids, weights):
+        # Chan et al.'s pairwise update of the Welford moments
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        self.min = min(self.min, minimum)
+        self.max = max(self.max, maximum)
+        centroids = np.concatenate([self._centroids, centroids])
+        weights = np.concatenate([self._weights, weights])
+        if len(centroids) > DIGEST_BUFFER:
+            centroids, weights = _compress(centroids, weights, self.compression)
+        else:
+            order = np.argsort(centroids, kind="stable")
+            centroids, weights = centroids[order], weights[order]
+        self._centroids, self._weights = centroids, weights
+        return self
+
+    def variance(self, ddof=1):
+        if self.count <= ddof:
+            return np.nan
+        return self._m2 / (self.count - ddof)
+
+    def std(self, ddof=0):
+        return np.sqrt(self.variance(ddof))
+
+    def quantile(self, q):
+        """Approximate ``q`` quantile, interpolated between centroids."""
+        if not self.count:
+            return np.nan
+        positions = np.cumsum(self._weights) - self._weights / 2
+        return float(
+            np.interp(
+                q * self.count,
+                np.concatenate([[0.0], positions, [self.count]]),
+                np.concatenate([[self.min], self._centroids, [self.max]]),
+            )
+        )
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+def result_stats(stem, chunk_size=CHUNK_SIZE):
+    """``OnlineStats`` of the similarities of one result set, read in chunks."""
+    similarity = read_results(stem).similarity
+    stats = OnlineStats()
+    for start in range(0, len(similarity), chunk_size):
+        stats.update(similarity[start : start + chunk_size])
+    return stats
+
+
+def result_histogram(stem, bins=50, value_range=None, chunk_size=CHUNK_SIZE):
+    """Histogram ``(counts, edges)`` of a result set, accumulated in chunks.
+
+    Without ``value_range`` the bins span the set's min and max, like
+    ``np.histogram`` on the whole array (this costs one more pass).
+    """
+    similarity = read_results(stem).similarity
+    if value_range is None:
+        summary = result_stats(stem, chunk_size)
+        value_range = (summary.min, summary.max)
+    edges = np.histogram_bin_edges([], bins, value_range)
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for start in range(0, len(similarity), chunk_size):
+        counts += np.histogram(similarity[start : start + chunk_size], edges)[0]
+    return counts, edges
+
+
+def result_box_stats(stem, summary, whis=1.5, chunk_size=CHUNK_SIZE):
+    """Box plot statistics of a result set for ``Axes.bxp``.
+
+    Quartiles come from ``summary`` (its ``OnlineStats``); whiskers and
+    outliers, which need the values beyond the quartiles, from one chunked
+    pass over the set.
+    """
+    q1, median, q3 = (summary.quantile(q) for q in (0.25, 0.5, 0.75))
+    low, high = q1 - whis * (q3 - q1), q3 + whis * (q3 - q1)
+    similarity = read_results(stem).similarity
+    whislo, whishi, fliers = np.inf, -np.inf, []
+    for start in range(0, len(similarity), chunk_size):
+        chunk = np.asarray(similarity[start : start + chunk_size], dtype=np.float64)
+        inside = chunk[(chunk >= low) & (chunk <= high)]
+        if len(inside):
+            whislo = min(whislo, inside.min())
+            whishi = max(whishi, inside.max())
+        fliers.append(chunk[(chunk < low) | (chunk > high)])
+    return {
+        "med": median,
+        "q1": q1,
+        "q3": q3,
+        "whislo": min(whislo, q1),
+        "whishi": max(whishi, q3),
+        "mean": summary.mean,
+        "fliers": np.concatenate(fliers) if fliers else np.empty(0),
+    }
+
+
+def collect_stats(results_dir, players, drawings, chunk_size=CHUNK_SIZE, stems=None):
+    """``OnlineStats`` of every (player, drawing) that has results.
+
+    Returns a dict keyed by ``(player, drawing)``; missing sets are left out.
+    ``stems`` (e.g. from ``discover_results``) maps the pairs to their result
+    sets instead of ``result_path``; pairs it lacks are skipped silently.
+    """
+    stats = {}
+    for player in players:
+        for drawing in drawings:
+            if stems is None:
+                stem = result_path(results_dir, player, drawing)
+            elif (player, drawing) in stems:
+                stem = stems[player, drawing]
+            else:
+                continue
+            try:
+                stats[player, drawing] = result_stats(stem, chunk_size)
+            except (OSError, ValueError, KeyError):
+                print(f"Results not found for {player}/{drawing}")
+    return stats
+
+
+def load_similarities(results_dir, players, drawings):
+    """Similarities of every (player, drawing) as a (P, D, N) float array.
+
+    Missing result sets are all NaN; shorter ones are NaN-padded.
+    """
+    columns = {}
+    for p, player in enumerate(players):
+        for d, drawing in enumerate(drawings):
+            try:
+                results = read_results(result_path(results_dir, player, drawing))
+            except (OSError, ValueError, KeyError):
+                print(f"Results not found for {player}/{drawing}")
+                continue
+            columns[p, d] = results.similarity
+
+    length = max((len(column) for column in columns.values()), default=0)
+    data = np.full((len(players), len(drawings), length), np.nan, dtype=np.float64)
+    for (p, d), column in columns.items():
+        data[p, d, : len(column)] = column
+    return data
+
+
+def _moments(data):
+    """Count, mean and unbiased variance along the last axis, ignoring NaN."""
+    valid = ~np.isnan(data)
+    count = valid.sum(axis=-1)
+    values = np.where(valid, data, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = values.sum(axis=-1) / count
+        deviations = np.where(valid, data - mean[..., np.newaxis], 0.0)
+        variance = (deviations**2).sum(axis=-1) / (count - 1)
+    return count, mean, variance
+
+
+def _holm(p_values):
+    """Holm step-down adjusted p-values of each row."""
+    m = p_values.shape[-1]
+    order = np.argsort(p_values, axis=-1)
+    ranked = np.take_along_axis(p_values, order, axis=-1) * (m - np.arange(m))
+    ranked = np.minimum(np.maximum.accumulate(ranked, axis=-1), 1.0)
+    adjusted = np.empty_like(ranked)
+    np.put_along_axis(adjusted, order, ranked, axis=-1)
+    return adjusted
+
+
+def _benjamini_hochberg(p_values):
+    """Benjamini-Hochberg (FDR) adjusted p-values of each row."""
+    m = p_values.shape[-1]
+    order = np.argsort(p_values, axis=-1)
+    ranked = np.take_along_axis(p_values, order, axis=-1) * m / np.arange(1, m + 1)
+    ranked = np.minimum.accumulate(ranked[..., ::-1], axis=-1)[..., ::-1]
+    ranked = np.minimum(ranked, 1.0)
+    adjusted = np.empty_like(ranked)
+    np.put_along_axis(adjusted, order, ranked, axis=-1)
+    return adjusted
+
+
+def ttests_from_moments(count, mean, variance, equal_var=True):
+    """t-tests of every pair of rows, for every column, from their moments.
+
+    ``count``, ``mean`` and ``variance`` are (P, D) arrays. Returns the
+    (first, second) row indices of the pairs and (pairs, D) arrays of the
+    t statistic, p-value, degrees of freedom and Cohen's d. ``equal_var``
+    selects Student's (pooled) test, as ``scipy.stats.ttest_ind`` does by
+    default, or Welch's test.
+    """
+    from scipy.stats import t as t_distribution
+
+    first, second = np.triu_indices(len(count), k=1)
+    n1, n2 = count[first], count[second]
+    m1, m2 = mean[first], mean[second]
+    v1, v2 = variance[first], variance[second]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pooled = ((n1 - 1) * v1 + (n2 - 1) * v2) / (n1 + n2 - 2)
+        if equal_var:
+            dof = n1 + n2 - 2.0
+            standard_error = np.sqrt(pooled * (1 / n1 + 1 / n2))
+        else:
+            a, b = v1 / n1, v2 / n2
+            dof = (a + b) ** 2 / (a**2 / (n1 - 1) + b**2 / (n2 - 1))
+            standard_error = np.sqrt(a + b)
+        statistic = (m1 - m2) / standard_error
+        p_value = 2 * t_distribution.sf(np.abs(statistic), dof)
+        cohens_d = (m1 - m2) / np.sqrt(pooled)
+    return first, second, statistic, p_value, dof, cohens_d
+
+
+def _ttest_table(count, mean, variance, players, drawings, equal_var):
+    import pandas as pd
+
+    first, second, statistic, p_value, dof, cohens_d = ttests_from_moments(
+        count, mean, variance, equal_var
+    )
+
+    # Corrections within each drawing: rows are drawings, columns are pairs
+    family = np.nan_to_num(p_value.T, nan=1.0)
+    pairs = max(len(first), 1)
+    bonferroni = np.minimum(family * pairs, 1.0)
+    holm = _holm(family) if len(first) else family
+    fdr = _benjamini_hochberg(family) if len(first) else family
+
+    drawing_index = np.repeat(np.arange(len(drawings)), len(first))
+    pair_index = np.tile(np.arange(len(first)), len(drawings))
+    players = np.asarray(players)
+    return pd.DataFrame(
+        {
+            "drawing": np.asarray(drawings)[drawing_index],
+            "player1": players[first][pair_index],
+            "player2": players[second][pair_index],
+            "n1": count[first][pair_index, drawing_index],
+            "n2": count[second][pair_index, drawing_index],
+            "mean1": mean[first][pair_index, drawing_index],
+            "mean2": mean[second][pair_index, drawing_index],
+            "t_statistic": statistic.T.ravel(),
+            "dof": dof.T.ravel(),
+            "p_value": p_value.T.ravel(),
+            "cohens_d": cohens_d.T.ravel(),
+            "p_bonferroni": bonferroni.ravel(),
+            "p_holm": holm.ravel(),
+            "p_fdr_bh": fdr.ravel(),
+        }
+    )
+
+
+def pairwise_ttests(data, players, drawings, equal_var=True):
+    """Tidy table of the t-tests of every pair of players on every drawing.
+
+    ``data`` is the (P, D, N) array of ``load_similarities``. The p-values
+    are corrected for the comparisons made on each drawing (Bonferroni, Holm
+    and Benjamini-Hochberg). Returns a pandas DataFrame with one row per
+    (drawing, pair of players).
+    """
+    count, mean, variance = _moments(data)
+    return _ttest_table(count, mean, variance, players, drawings, equal_var)
+
+
+def stats_ttests(stats, players, drawings, equal_var=True):
+    """``pairwise_ttests`` table computed from ``collect_stats`` accumulators.
+
+    Pairs involving a missing (player, drawing) have NaN statistics.
+    """
+    shape = (len(players), len(drawings))
+    count = np.zeros(shape, dtype=np.int64)
+    mean = np.full(shape, np.nan)
+    variance = np.full(shape, np.nan)
+    for p, player in enumerate(players):
+        for d, drawing in enumerate(drawings):
+            accumulator = stats.get((player, drawing))
+            if accumulator is not None and accumulator.count:
+                count[p, d] = accumulator.count
+                mean[p, d] = accumulator.mean
+                variance[p, d] = accumulator.variance()
+    return _ttest_table(count, mean, variance, players, drawings, equal_var)
@@ -0,0 +1,122 @@
+"""Generic runner of a transformation sweep over a ``GridSpec``.
+
+``run_sweep`` generates the variants of one image for every point of a grid,
+embeds them in batches, scores them against a reference embedding and
+checkpoints the similarities to a result set (see ``compvision.results``).
+An interrupted sweep resumes from the points already stored.
+"""
+
+import itertools
+
+from compvision.embedding import BATCH_SIZE, get_image_embeddings
+from compvision.grid import load_grid
+from compvision.pipeline import TRANSFORM_WORKERS
+from compvision.results import (
+    DATA_SUFFIX,
+    ResultWriter,
+    completed_points,
+    point_key,
+    record_dtype,
+)
+from compvision.similarity import similarity_matrix
+from compvision.transforms import generate_variations, resize_major
+
+# Variations embedded between two checkpoints of the results file
+CHECKPOINT_EVERY = 4 * BATCH_SIZE
+
+
+def sweep_metadata(grid, metadata=None):
+    """Metadata of a sweep's result set: ``metadata`` plus the grid spec."""
+    return {**(metadata or {}), "grid": load_grid(grid).to_dict()}
+
+
+def pending_points(output_path, grid="dense", metadata=None):
+    """Points of ``grid`` not yet stored in the result set at ``output_path``.
+
+    A result set written with other metadata (e.g. another model, backend or
+    grid) does not count. Sweep settings missing from older result sets are
+    taken to be their defaults (see ``compvision.results.METADATA_DEFAULTS``)
+    and result sets from before the grid was recorded count for any grid.
+    """
+    spec = load_grid(grid)
+    done = completed_points(output_path, sweep_metadata(spec, metadata))
+    return [point for point in spec.points() if point_key(point) not in done]
+
+
+def run_sweep(
+    image,
+    reference,
+    output_path,
+    processor,
+    model,
+    grid="dense",
+    metadata=None,
+    batch_size=BATCH_SIZE,
+    checkpoint_every=CHECKPOINT_EVERY,
+    resume=True,
+    transform_workers=TRANSFORM_WORKERS,
+    model_resolution=False,
+    fast_preprocess=False,
+    backend="fp32",
+    num_layers=None,
+    verbose=False,
+):
+    """Sweep ``image`` over ``grid`` and score every variant against ``reference``.
+
+    ``grid`` is a ``GridSpec``, a preset name or a JSON spec path and
+    ``reference`` a (1, hidden) embedding. The similarities are appended to
+    the result set at ``output_path`` every ``checkpoint_every`` variants;
+    with ``resume`` only the points missing from it are computed. Returns
+    ``output_path``.
+    """
+    spec = load_grid(grid)
+    points = spec.points()
+    metadata = sweep_metadata(spec, metadata)
+    pending = pending_points(output_path, spec, metadata) if resume else points
+    if not pending:
+        print(
+            f"All {len(points)} variations already saved to {output_path}{DATA_SUFFIX}"
+        )
+        return output_path
+    if len(pending) < len(points):
+        done = len(points) - len(pending)
+        print(f"Resuming from checkpoint: {done}/{len(points)} done")
+
+    # The variants are produced by a thread pool while the model runs and
+    # embedded in batches. Points are swept resize-major so only one full
+    # resolution resize is held at a time; the records store their points,
+    # so the order of the result set does not matter
+    pending = resize_major(pending)
+    variations = generate_variations(
+        image,
+        pending,
+        workers=transform_workers,
+        model_resolution=model_resolution,
+        extra_ops=spec.extra_ops,
+    )
+    append = len(pending) < len(points)
+    with ResultWriter(
+        output_path, metadata, append=append, dtype=record_dtype(spec.extra_ops)
+    ) as writer:
+        for start in range(0, len(pending), checkpoint_every):
+            chunk = pending[start : start + checkpoint_every]
+            embeddings = get_image_embeddings(
+                itertools.islice(variations, len(chunk)),
+                processor,
+                model,
+                batch_size,
+                fast_preprocess=fast_preprocess,
+                backend=backend,
+                num_layers=num_layers,
+            )
+
+            # Calculate the similarities of the chunk with a single matrix
+            # product and checkpoint them to the results file
+            similarities = similarity_matrix(embeddings, reference)[:, 0]
+            writer.append(chunk, similarities)
+
+            if verbose:
+                for similarity in similarities.tolist():
+                    print(f"{similarity:.4f}")
+
+    return output_path
@@ -0,0 +1,282 @@
+"""Rotation, resize and dilation variants of an image."""
+
+import collections
+import itertools
+import threading
+import zlib
+
+import cv2
+import numpy as np
+
+from compvision.pipeline import TRANSFORM_WORKERS, prefetch_map
+
+# Transformation grid swept for every image
+DEGREES = range(0, 361, 18)
+RESIZE_PERCENTS = range(50, 151, 5)
+DILATION_ITERS = range(1, 4)
+NUM_VARIATIONS = len(DEGREES) * len(RESIZE_PERCENTS) * len(DILATION_ITERS)
+
+KERNEL = np.ones((3, 3), np.uint8)
+
+# Side of the square images the ViT processor feeds to the model
+MODEL_INPUT_SIZE = 224
+
+# Factor above MODEL_INPUT_SIZE at which model-resolution variants are warped
+# and dilated before the final area downscale
+MODEL_RESOLUTION_OVERSAMPLE = 2
+
+
+def variation_grid(
+    degrees=DEGREES, resize_percents=RESIZE_PERCENTS, dilation_iters=DILATION_ITERS
+):
+    """List every (degree, resize_percent, dilation_iter) combination in sweep order."""
+    return list(itertools.product(degrees, resize_percents, dilation_iters))
+
+
+def resize_major(grid):
+    """Grid points reordered by resize percent, then rotation.
+
+    ``generate_variations`` drops each resized copy of the image once its
+    last rotation is done, so walking the grid in this order holds a single
+    full resolution copy at a time instead of one per resize percent. The
+    order within a (rotation, resize) group is kept.
+    """
+    return sorted(grid, key=lambda point: (point[1], point[0]))
+
+
+def base_case_grid(num_variations=1000):
+    """Grid of the base case: 10 rotations x 10 resizes x 3 dilations, capped."""
+    from compvision.grid import GRIDS
+
+    return GRIDS["base_case"].points()[:num_variations]
+
+
+def resize(image, resize_percent):
+    """Resize an image to ``resize_percent`` of its size with Lanczos interpolation."""
+    height, width = image.shape[:2]
+
+    # Calculate new dimensions based on resize_percent
+    new_width = int(width * resize_percent / 100)
+    new_height = int(height * resize_percent / 100)
+
+    return cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LANCZOS4)
+
+
+def rotate(image, degree):
+    """Rotate an image around its center, keeping its size."""
+    height, width = image.shape[:2]
+    center = (width // 2, height // 2)
+    rotation_matrix = cv2.getRotationMatrix2D(center, degree, 1.0)
+    return cv2.warpAffine(image, rotation_matrix, (width, height))
+
+
+def dilate_levels(image, dilation_iters):
+    """Dilate an image for each iteration count, building on the previous level.
+
+    Dilating the result of ``n`` iterations once more gives exactly the same
+    pixels as ``n + 1`` iterations, so each level costs a single iteration.
+    Results are returned in the order of ``dilation_iters``.
+    """
+    levels = {}
+    current, done = image, 0
+    for dilation_iter in sorted(set(dilation_iters)):
+        current = cv2.dilate(current, KERNEL, iterations=dilation_iter - done)
+        done = dilation_iter
+        levels[dilation_iter] = current
+    return [levels[dilation_iter] for dilation_iter in dilation_iters]
+
+
+def apply_variation(image, degree, resize_percent, dilation_iter):
+    """Resize, rotate around the center and dilate an image."""
+    rotated = rotate(resize(image, resize_percent), degree)
+    return cv2.dilate(rotated, KERNEL, iterations=dilation_iter)
+
+
+def apply_extra_ops(image, extra_ops, point):
+    """Apply the extra operations of a grid point to one of its variants.
+
+    ``point[3:]`` holds the value of each of ``extra_ops`` (see
+    ``compvision.grid``): ``crop_percent`` keeps that percentage of the width
+    and height around the center, ``blur_sigma`` is a Gaussian blur and
+    ``noise_std`` adds Gaussian noise seeded by the grid point, so a variant
+    is the same in every run.
+    """
+    for op, value in zip(extra_ops, point[3:]):
+        if op == "crop_percent" and value < 100:
+            height, width = image.shape[:2]
+            new_height = max(1, int(height * value / 100))
+            new_width = max(1, int(width * value / 100))
+            top, left = (height - new_height) // 2, (width - new_width) // 2
+            image = image[top : top + new_height, left : left + new_width]
+        elif op == "blur_sigma" and value > 0:
+            image = cv2.GaussianBlur(image, (0, 0), value)
+        elif op == "noise_std" and value > 0:
+            seed = zlib.crc32(np.asarray(point, dtype=np.float32).tobytes())
+            noise = np.random.default_rng(seed).normal(0.0, value, image.shape)
+            image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    return image
+
+
+class _ResizeCache:
+    """Resized copies of one image, each computed once even across threads.
+
+    ``uses`` counts the groups that need each resize percent; a copy is
+    dropped once all of them have ``release``d it.
+    """
+
+    def __init__(self, image, uses):
+        self.image = image
+        self._uses = dict(uses)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, resize_percent):
+        with self._lock:
+            entry = self._entries.setdefault(resize_percent, [threading.Lock(), None])
+        with entry[0]:
+            if entry[1] is None:
+                entry[1] = resize(self.image, resize_percent)
+        return entry[1]
+
+    def release(self, resize_percent):
+        with self._lock:
+            self._uses[resize_percent] -= 1
+            if not self._uses[resize_percent]:
+                del self._entries[resize_percent]
+
+
+def _homogeneous(matrix):
+    return np.vstack([matrix, [0.0, 0.0, 1.0]])
+
+
+class _ModelResolution:
+    """Variants computed directly at (a multiple of) the model input size.
+
+    The exact path resizes the full image, rotates it, dilates it and then
+    lets the processor squash it to 224x224. Here resize, rotation and the
+    final squash are composed into one affine warp of a copy of the image
+    shrunk once to the working size, and dilation uses a kernel scaled by
+    the same factor, so each variant costs a few hundred thousand pixels
+    instead of up to millions.
+    """
+
+    def __init__(
+        self, image, size=MODEL_INPUT_SIZE, oversample=MODEL_RESOLUTION_OVERSAMPLE
+    ):
+        self.height, self.width = image.shape[:2]
+        self.size = size
+        self.work = size * oversample
+
+        # Shrink once so the composed warp never downsamples (no aliasing)
+        self.factor = min(1.0, self.work / max(self.height, self.width))
+        if self.factor < 1.0:
+            shrunk_size = (
+                max(1, round(self.width * self.factor)),
+                max(1, round(self.height * self.factor)),
+            )
+            self.image = cv2.resize(image, shrunk_size, interpolation=cv2.INTER_AREA)
+        else:
+            self.image = image
+
+    def group(self, degree, resize_percent, dilation_iters):
+        new_width = int(self.width * resize_percent / 100)
+        new_height = int(self.height * resize_percent / 100)
+
+        # shrunk -> original -> resized -> rotated -> working resolution
+        unshrink = np.diag([1 / self.factor, 1 / self.factor, 1.0])
+        to_resized = np.diag([new_width / self.width, new_height / self.height, 1.0])
+        center = (new_width // 2, new_height // 2)
+        rotation = _homogeneous(cv2.getRotationMatrix2D(center, degree, 1.0))
+        to_work = np.diag([self.work / new_width, self.work / new_height, 1.0])
+        matrix = to_work @ rotation @ to_resized @ unshrink
+
+        warped = cv2.warpAffine(
+            self.image, matrix[:2], (self.work, self.work), flags=cv2.INTER_LINEAR
+        )
+
+        variants = []
+        for dilation_iter in dilation_iters:
+            # n iterations of a 3x3 kernel cover a (2n + 1) pixel square
+            side = 2 * dilation_iter + 1
+            kernel_width = max(1, round(side * self.work / new_width))
+            kernel_height = max(1, round(side * self.work / new_height))
+            dilated = cv2.dilate(
+                warped, np.ones((kernel_height, kernel_width), np.uint8)
+            )
+            variants.append(
+                cv2.resize(
+                    dilated, (self.size, self.size), interpolation=cv2.INTER_AREA
+                )
+            )
+        return variants
+
+
+def generate_variations(
+    image,
+    grid=None,
+    workers: int = TRANSFORM_WORKERS,
+    model_resolution=False,
+    extra_ops=(),
+):
+    """Yield the variant of ``image`` for every grid point, in grid order.
+
+    The grid is walked as a tree: each resize percent is computed once and
+    reused for every rotation, each (rotation, resize) is warped once, and
+    the dilation levels are built incrementally from it. For the default
+    grid this means 21 resizes and 441 rotations instead of 1,323 of each.
+    A resized copy is kept until its last rotation is done, so grids in
+    ``resize_major`` order hold only the copies in flight.
+
+    Rotation groups are produced ahead of time by a thread pool into a
+    bounded queue, so transforms overlap with whatever consumes them. With
+    ``workers=0`` the variants are computed inline.
+
+    With ``model_resolution=True`` the variants are approximated directly at
+    MODEL_INPUT_SIZE instead (see ``utils/benchmark_model_resolution.py`` for
+    the resulting similarity deviation).
+
+    With ``extra_ops`` the grid points carry a value for each of those
+    operations after the dilation (see ``apply_extra_ops``).
+    """
+    if grid is None:
+        grid = variation_grid()
+    if extra_ops and model_resolution:
+        raise ValueError("Extra operations need the exact (full resolution) variants")
+
+    groups = [
+        (key, list(points))
+        for key, points in itertools.groupby(grid, key=lambda point: tuple(point[:2]))
+    ]
+
+    if model_resolution:
+        fast = _ModelResolution(image)
+
+        def transform(group):
+            (degree, resize_percent), points = group
+            dilation_iters = [point[2] for point in points]
+            return fast.group(degree, resize_percent, dilation_iters)
+
+    else:
+        resized = _ResizeCache(
+            image,
+            collections.Counter(resize_percent for (_, resize_percent), _ in groups),
+        )
+
+        def transform(group):
+            (degree, resize_percent), points = group
+            rotated = rotate(resized.get(resize_percent), degree)
+            resized.release(resize_percent)
+            variants = dilate_levels(rotated, [point[2] for point in points])
+            if extra_ops:
+                variants = [
+                    apply_extra_ops(variant, extra_ops, point)
+                    for variant, point in zip(variants, points)
+                ]
+            return variants
+
+    if workers < 1:
+        levels = map(transform, groups)
+    else:
+        levels = prefetch_map(transform, groups, workers)
+    for variants in levels:
+        yield from variants
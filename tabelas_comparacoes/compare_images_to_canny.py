@@ -4,36 +4,30 @@ Script para gerar uma tabela de comparação entre imagens de desenhos de múlti
 e suas respectivas imagens Canny de referência, usando embeddings do modelo ViT, com visualização em HTML.
 """
 
-import glob
 import os
+import sys
 
-import numpy as np
 from jinja2 import Template
-from transformers import ViTImageProcessor, ViTModel
 
-from novo import embed_image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-
-def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
-    """Calcula a similaridade de cossenos entre dois vetores."""
-    dot = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return float(dot / (norm1 * norm2))
+from compvision import EmbeddingCache, embed_images, load_model, similarity_matrix
+from compvision.references import reference_index
 
 
 def main():
     print("Iniciando comparação de imagens...")
 
     # Carrega modelo e processador ViT
-    processor = ViTImageProcessor.from_pretrained("google/vit-base-patch16-224-in21k")
-    model = ViTModel.from_pretrained("google/vit-base-patch16-224-in21k")
+    processor, model = load_model()
+    cache = EmbeddingCache()
 
     players_dir = "players"
     canny_dir = "fotos_canny"
 
+    # Embeddings das imagens Canny, calculados uma única vez e reaproveitados
+    references = reference_index(processor, model, canny_dir, cache=cache)
+
     # Lista jogadores
     players = sorted(
         d
@@ -52,35 +46,37 @@ def main():
         if os.path.isfile(os.path.join(first_player_dir, f))
     )
 
-    # Estrutura para armazenar dados da tabela
-    table_data = []
+    # Encontra as imagens Canny e os desenhos de cada jogador a comparar
+    drawings = []
+    cell_paths = []
+    cell_positions = []
 
     for filename in drawing_files:
         name, _ = os.path.splitext(filename)
-        # Encontra arquivo Canny correspondente
-        pattern = os.path.join(canny_dir, f"canny_{name}.*")
-        canny_list = glob.glob(pattern)
-
-        if not canny_list:
+        # Verifica se existe a imagem Canny correspondente
+        if name not in references:
             print(f"Nenhuma imagem Canny encontrada para '{name}', pulando.")
             continue
 
-        canny_path = canny_list[0]
-        emb_canny = embed_image(canny_path, processor, model)
+        drawings.append(name)
 
-        # Calcula similaridades para cada jogador
-        row = [name]
-        for player in players:
+        for column, player in enumerate(players):
             player_path = os.path.join(players_dir, player, filename)
             if not os.path.isfile(player_path):
                 print(f"Aviso: {player} não tem o desenho '{filename}', pulando.")
-                row.append("N/A")
                 continue
-            emb = embed_image(player_path, processor, model)
-            sim = cosine_similarity(emb, emb_canny)
-            row.append(f"{sim:.4f}")
+            cell_paths.append(player_path)
+            cell_positions.append((len(drawings) - 1, column))
+
+    # Calcula todas as similaridades com um único produto de matrizes
+    emb_canny = references.lookup(drawings)
+    emb_cells = embed_images(cell_paths, processor, model, cache=cache)
+    similarities = similarity_matrix(emb_cells, emb_canny)
 
-        table_data.append(row)
+    # Estrutura para armazenar dados da tabela
+    table_data = [[name] + ["N/A"] * len(players) for name in drawings]
+    for cell, (row, column) in enumerate(cell_positions):
+        table_data[row][column + 1] = f"{similarities[cell, row]:.4f}"
 
     # Template HTML
     html_template = """
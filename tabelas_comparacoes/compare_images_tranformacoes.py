@@ -7,24 +7,22 @@ e suas respectivas imagens Canny de referência, usando embeddings do modelo ViT
 
 import glob
 import os
+import sys
 
 import cv2
 import numpy as np
 from jinja2 import Template
 from PIL import Image
-from transformers import ViTImageProcessor, ViTModel
 
-from novo import embed_image
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-
-def cosine_similarity(vec1: np.ndarray, vec2: np.ndarray) -> float:
-    """Calcula a similaridade de cossenos entre dois vetores."""
-    dot = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return float(dot / (norm1 * norm2))
+from compvision import (
+    EmbeddingCache,
+    embed_image,
+    embed_images,
+    load_model,
+    similarity_matrix,
+)
 
 
 def apply_transformations(image_path, output_dir, filename):
@@ -80,8 +78,8 @@ def main():
     print("Iniciando comparação de imagens para Bruno...")
 
     # Carrega modelo e processador ViT
-    processor = ViTImageProcessor.from_pretrained("google/vit-base-patch16-224-in21k")
-    model = ViTModel.from_pretrained("google/vit-base-patch16-224-in21k")
+    processor, model = load_model()
+    cache = EmbeddingCache()
 
     bruno_dir = "players/bruno"
     canny_dir = "fotos_canny"
@@ -131,21 +129,21 @@ def main():
             continue
 
         canny_path = canny_list[0]
-        emb_canny = embed_image(canny_path, processor, model)
+        emb_canny = embed_image(canny_path, processor, model, cache=cache)
 
         # Aplica transformações e obtém caminhos
         bruno_path = os.path.join(bruno_dir, filename)
         transformed_paths = apply_transformations(bruno_path, transformed_dir, filename)
 
-        # Calcula similaridades para cada transformação
-        row = [name]
-        for transform in transformations:
-            if transform not in transformed_paths:
-                row.append("N/A")
-                continue
-            emb = embed_image(transformed_paths[transform], processor, model)
-            sim = cosine_similarity(emb, emb_canny)
-            row.append(f"{sim:.4f}")
+        # Calcula similaridades para todas as transformações de uma vez
+        available = [t for t in transformations if t in transformed_paths]
+        emb = embed_images(
+            [transformed_paths[t] for t in available], processor, model, cache=cache
+        )
+        sims = dict(zip(available, similarity_matrix(emb, emb_canny)[:, 0]))
+        row = [name] + [
+            f"{sims[t]:.4f}" if t in sims else "N/A" for t in transformations
+        ]
 
         table_data.append((row, transformed_paths))
 
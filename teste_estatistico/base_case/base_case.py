@@ -1,23 +1,21 @@
+import argparse
 import cv2
+import json
 import numpy as np
-from PIL import Image
-from transformers import ViTImageProcessor, ViTModel
 import os
+import sys
 
-def calculate_cosine_similarity(vec1, vec2):
-    dot_product = np.dot(vec1, vec2.transpose())
-    magnitude1 = np.linalg.norm(vec1)
-    magnitude2 = np.linalg.norm(vec2)
-    similarity = dot_product / (magnitude1 * magnitude2)
-    return float(similarity[0][0]) if isinstance(similarity, np.ndarray) else float(similarity)
-
-def get_image_embedding(image, processor, model):
-    if isinstance(image, np.ndarray):
-        image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    inputs = processor(images=image, return_tensors="pt")
-    outputs = model(**inputs)
-    embedding = outputs.last_hidden_state[:, 0, :].squeeze(1)
-    return embedding.detach().numpy()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from compvision import BACKENDS, EmbeddingCache, generate_variations, get_image_embeddings, load_model, resize_major, similarity_matrix
+from compvision.cache import PROJECT_ROOT, file_hash
+from compvision.embedding import embedding_fingerprint
+from compvision.grid import GRIDS, load_grid
+from compvision.references import reference_index
+from compvision.results import DATA_SUFFIX, record_dtype, write_results
+
+# Embeddings of the insper.png variants, reused across runs
+VARIANTS_DIR = os.path.join(PROJECT_ROOT, ".base_case_embeddings")
 
 def ensure_results_directory():
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -26,47 +24,31 @@ def ensure_results_directory():
         os.makedirs(results_dir)
     return results_dir
 
-def generate_variations(image, num_variations=1000):
-    variations = []
-    kernel = np.ones((3, 3), np.uint8)
-    
-    # Calculate step sizes to get approximately 1000 variations
-    # We'll use 10 rotation steps, 10 resize steps, and 10 dilation steps
-    rotation_steps = np.linspace(0, 360, 10)
-    resize_steps = np.linspace(50, 150, 10)
-    dilation_steps = range(1, 4)
-    
-    for degree in rotation_steps:
-        for resize_percent in resize_steps:
-            for dilation_iter in dilation_steps:
-                height, width = image.shape[:2]
-                
-                # Calculate new dimensions based on resize_percent
-                new_width = int(width * resize_percent / 100)
-                new_height = int(height * resize_percent / 100)
-                
-                # Resize image
-                resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LANCZOS4)
-                
-                # Apply rotation
-                center = (new_width // 2, new_height // 2)
-                rotation_matrix = cv2.getRotationMatrix2D(center, degree, 1.0)
-                rotated = cv2.warpAffine(resized, rotation_matrix, (new_width, new_height))
-                
-                # Apply dilation
-                dilated = cv2.dilate(rotated, kernel, iterations=dilation_iter)
-                
-                variations.append(dilated)
-                
-                if len(variations) >= num_variations:
-                    return variations
-    
-    return variations
-
-def process_base_case():
+def load_variant_embeddings(path, fingerprint, source_hash, grid):
+    """Saved variant embeddings, or None if they were computed from other inputs."""
+    try:
+        with open(path + ".json", "r") as f:
+            info = json.load(f)
+        embeddings = np.load(path + ".npy")
+    except (OSError, ValueError):
+        return None
+    expected = {"fingerprint": fingerprint, "source": source_hash, "grid": [list(point) for point in grid]}
+    if info != expected or len(embeddings) != len(grid):
+        return None
+    return embeddings
+
+def save_variant_embeddings(path, embeddings, fingerprint, source_hash, grid):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path + ".tmp.npy", embeddings)
+    with open(path + ".json.tmp", "w") as f:
+        json.dump({"fingerprint": fingerprint, "source": source_hash, "grid": [list(point) for point in grid]}, f)
+    os.replace(path + ".tmp.npy", path + ".npy")
+    os.replace(path + ".json.tmp", path + ".json")
+
+def process_base_case(backend="fp32", force=False, grid="base_case"):
     # Initialize the model and processor
-    processor = ViTImageProcessor.from_pretrained("google/vit-base-patch16-224-in21k")
-    model = ViTModel.from_pretrained("google/vit-base-patch16-224-in21k")
+    processor, model = load_model()
+    cache = EmbeddingCache()
 
     # Get current directory and project root
     current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -86,52 +68,57 @@ def process_base_case():
         print("Failed to load insper.png!")
         return
 
-    # Generate variations
-    print("Generating variations...")
-    variations = generate_variations(insper_img)
-    print(f"Generated {len(variations)} variations")
-
-    # Get embeddings for all variations
-    print("Calculating embeddings for variations...")
-    variation_embeddings = [get_image_embedding(var, processor, model) for var in variations]
+    # The (N, hidden) variant embeddings are computed once per model, backend,
+    # insper.png and grid, and reused by later runs
+    spec = load_grid(grid)
+    grid = resize_major(spec.points())
+    fingerprint = embedding_fingerprint(processor, model, backend=backend)
+    source_hash = file_hash(insper_path)
+    variants_path = os.path.join(VARIANTS_DIR, f"variants-{fingerprint[:16]}")
+    variation_embeddings = None if force else load_variant_embeddings(variants_path, fingerprint, source_hash, grid)
+
+    if variation_embeddings is None:
+        # Variants are generated resize-major and go straight to batched
+        # inference, so only a batch of them and one resized copy of
+        # insper.png are ever held in memory. They are persisted as a whole
+        # below, so they skip the shared embedding cache
+        print(f"Calculating embeddings for {len(grid)} variations...")
+        variations = generate_variations(insper_img, grid, extra_ops=spec.extra_ops)
+        variation_embeddings = get_image_embeddings(variations, processor, model, backend=backend)
+        save_variant_embeddings(variants_path, variation_embeddings, fingerprint, source_hash, grid)
+    else:
+        print(f"Reusing the embeddings of {len(grid)} variations from {variants_path}.npy")
 
     # Create results directory
     results_dir = ensure_results_directory()
 
-    # Process each Canny image
-    for canny_file in os.listdir(canny_dir):
-        if canny_file.lower().endswith((".png", ".jpg", ".jpeg")):
-            canny_path = os.path.join(canny_dir, canny_file)
-            canny_img = cv2.imread(canny_path)
-            
-            if canny_img is None:
-                print(f"Failed to load {canny_file}, skipping...")
-                continue
-
-            print(f"\nProcessing {canny_file}...")
-            
-            # Get Canny image embedding
-            canny_embedding = get_image_embedding(canny_img, processor, model)
-
-            # Calculate similarities for all variations
-            similarities = []
-            for i, var_embedding in enumerate(variation_embeddings):
-                similarity = calculate_cosine_similarity(canny_embedding, var_embedding)
-                similarities.append(similarity)
-                if (i + 1) % 100 == 0:
-                    print(f"Processed {i + 1} variations...")
-
- 
-            
-            # Create a separate file for each Canny image
-            base_filename = os.path.splitext(canny_file)[0]
-            output_file = os.path.join(results_dir, f"similarities_{base_filename}.txt")
-            
-            with open(output_file, "w") as f:
-            
-                f.write("\n".join([f"{s:.4f}" for s in similarities]))
-            
-            print(f"Results saved to {output_file}")
+    # Get the Canny image embeddings from the reference index
+    references = reference_index(processor, model, canny_dir, cache=cache, backend=backend)
+
+    # Calculate similarities between all variations and all Canny images at once
+    similarities = similarity_matrix(variation_embeddings, references.embeddings)
+
+    for column, drawing in enumerate(references.names):
+        # Create a separate result set for each Canny image; other grids
+        # than the base case one get their own sets
+        output_file = os.path.join(results_dir, f"similarities_canny_{drawing}")
+        if spec.name != "base_case":
+            output_file = f"{output_file}_{spec.name}"
+        metadata = {
+            "player": "base_case",
+            "drawing": drawing,
+            "model": model.config._name_or_path,
+            "backend": backend,
+            "grid": spec.to_dict(),
+        }
+        write_results(output_file, grid, similarities[:, column], metadata, record_dtype(spec.extra_ops))
+
+        print(f"Results saved to {output_file}{DATA_SUFFIX}")
 
 if __name__ == "__main__":
-    process_base_case()
+    parser = argparse.ArgumentParser(description="Compare variations of insper.png with every Canny image.")
+    parser.add_argument("--backend", choices=BACKENDS, default="fp32", help="inference backend")
+    parser.add_argument("--force", action="store_true", help="recompute the variant embeddings")
+    parser.add_argument("--grid", default="base_case", help=f"transformation grid: one of {', '.join(GRIDS)} or a JSON spec file")
+    args = parser.parse_args()
+    process_base_case(args.backend, args.force, args.grid)
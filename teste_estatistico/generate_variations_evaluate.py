@@ -1,29 +1,21 @@
+import argparse
 import cv2
-import numpy as np
-from PIL import Image
-from transformers import ViTImageProcessor, ViTModel
+import multiprocessing
 import os
+import sys
+import time
+import torch
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def calculate_cosine_similarity(vec1, vec2):
-    dot_product = np.dot(vec1, vec2.transpose())
-    magnitude1 = np.linalg.norm(vec1)
-    magnitude2 = np.linalg.norm(vec2)
-    similarity = dot_product / (magnitude1 * magnitude2)
-    return (
-        float(similarity[0][0])
-        if isinstance(similarity, np.ndarray)
-        else float(similarity)
-    )
-
-
-def get_image_embedding(image, processor, model):
-    if isinstance(image, np.ndarray):
-        image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-    inputs = processor(images=image, return_tensors="pt")
-    outputs = model(**inputs)
-    embedding = outputs.last_hidden_state[:, 0, :].squeeze(1)
-    return embedding.detach().numpy()
+from compvision import BACKENDS, BATCH_SIZE, MODEL_NAME, EmbeddingCache, load_model
+from compvision.backends import set_onnx_threads
+from compvision.grid import GRIDS, load_grid
+from compvision.pipeline import TRANSFORM_WORKERS
+from compvision.references import reference_index
+from compvision.results import DATA_SUFFIX, result_path
+from compvision.sweep import CHECKPOINT_EVERY, pending_points, run_sweep
 
 
 def get_all_available_images():
@@ -32,10 +24,10 @@ def get_all_available_images():
     players_dir = os.path.join(project_root, "players")
 
     available_images = []
-    for player_name in os.listdir(players_dir):
+    for player_name in sorted(os.listdir(players_dir)):
         player_dir = os.path.join(players_dir, player_name)
         if os.path.isdir(player_dir):
-            for image_file in os.listdir(player_dir):
+            for image_file in sorted(os.listdir(player_dir)):
                 if image_file.lower().endswith((".png", ".jpg", ".jpeg")):
                     canny_path = os.path.join(
                         project_root, "fotos_canny", f"canny_{image_file}"
@@ -50,11 +42,67 @@ def ensure_results_directory():
     results_dir = os.path.join(current_dir, "transformation_results")
     if not os.path.exists(results_dir):
         os.makedirs(results_dir)
-    
+
     return results_dir
 
 
-def process_single_image(player_name, image_file, processor, model):
+def get_output_path(results_dir, player_name, image_file, grid="dense"):
+    """Path stem of the result set of a (player, image) pair swept over ``grid``."""
+    return result_path(
+        results_dir,
+        player_name,
+        os.path.splitext(image_file)[0],
+        load_grid(grid).name,
+    )
+
+
+def sweep_settings(
+    player_name,
+    image_file,
+    model_name=MODEL_NAME,
+    model_resolution=False,
+    fast_preprocess=False,
+    backend="fp32",
+    num_layers=None,
+    **options,
+):
+    """Metadata of the result set of a (player, image) pair swept with
+    ``options`` (as passed to ``process_single_image``)."""
+    return {
+        "player": player_name,
+        "drawing": os.path.splitext(image_file)[0],
+        "model": model_name,
+        "model_resolution": model_resolution,
+        "fast_preprocess": fast_preprocess,
+        "backend": backend,
+        "num_layers": num_layers,
+    }
+
+
+def is_complete(output_path, grid="dense", metadata=None):
+    """Whether a result set holds one similarity for every point of the grid,
+    computed with the sweep settings in ``metadata``."""
+    return not pending_points(output_path, grid, metadata)
+
+
+def process_single_image(
+    player_name,
+    image_file,
+    processor,
+    model,
+    batch_size=BATCH_SIZE,
+    cache=None,
+    results_dir=None,
+    verbose=True,
+    transform_workers=TRANSFORM_WORKERS,
+    model_resolution=False,
+    fast_preprocess=False,
+    checkpoint_every=CHECKPOINT_EVERY,
+    resume=True,
+    backend="fp32",
+    num_layers=None,
+    grid="dense",
+):
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(current_dir)
 
@@ -71,72 +119,309 @@ def process_single_image(player_name, image_file, processor, model):
         return
 
     original_img = cv2.imread(original_img_path)
-    canny_img = cv2.imread(canny_img_path)
 
-    if original_img is None or canny_img is None:
+    if original_img is None:
         print(f"Failed to load images for {image_file}, skipping...")
         return
 
-    canny_embedding = get_image_embedding(canny_img, processor, model)
-    results = []
+    # The Canny embeddings are only computed when a reference changed
+    references = reference_index(
+        processor,
+        model,
+        canny_dir,
+        cache=cache,
+        fast_preprocess=fast_preprocess,
+        backend=backend,
+        num_layers=num_layers,
+    )
+    canny_embedding = references.vector(os.path.splitext(image_file)[0])
+
+    if results_dir is None:
+        results_dir = ensure_results_directory()
+    output_path = get_output_path(results_dir, player_name, image_file, grid)
+    metadata = sweep_settings(
+        player_name,
+        image_file,
+        model.config._name_or_path,
+        model_resolution,
+        fast_preprocess,
+        backend,
+        num_layers,
+    )
 
-    kernel = np.ones((3, 3), np.uint8)
+    # Test all combinations of the grid, only sweeping the points missing
+    # from a previous, interrupted run
+    run_sweep(
+        original_img,
+        canny_embedding,
+        output_path,
+        processor,
+        model,
+        grid=grid,
+        metadata=metadata,
+        batch_size=batch_size,
+        checkpoint_every=checkpoint_every,
+        resume=resume,
+        transform_workers=transform_workers,
+        model_resolution=model_resolution,
+        fast_preprocess=fast_preprocess,
+        backend=backend,
+        num_layers=num_layers,
+        verbose=verbose,
+    )
 
-    # Test all combinations of rotation, resize and dilation
-    for degree in range(0, 361, 18):
-        for resize_percent in range(50, 151, 5):
-            for dilation_iter in range(1, 4):
-                height, width = original_img.shape[:2]
+    print(f"\nResults saved to {output_path}{DATA_SUFFIX}")
+    return output_path
+
+
+def run_batch(pairs, processor, model, results_dir, force=False, **options):
+    """Process every (player, image) pair, skipping the ones already complete.
+
+    ``options`` are passed on to ``process_single_image``.
+    """
+    total = len(pairs)
+    start = time.perf_counter()
+
+    for idx, (player_name, image_file) in enumerate(pairs, 1):
+        output_path = get_output_path(
+            results_dir, player_name, image_file, options.get("grid", "dense")
+        )
+        metadata = sweep_settings(
+            player_name, image_file, model.config._name_or_path, **options
+        )
+        if not force and is_complete(
+            output_path, options.get("grid", "dense"), metadata
+        ):
+            print(
+                f"[{idx}/{total}] {player_name}/{image_file} already complete, skipping"
+            )
+            continue
+
+        print(f"[{idx}/{total}] {player_name}/{image_file}")
+        process_single_image(
+            player_name,
+            image_file,
+            processor,
+            model,
+            results_dir=results_dir,
+            verbose=False,
+            resume=not force,
+            **options,
+        )
+        elapsed = time.perf_counter() - start
+        print(f"[{idx}/{total}] done, {elapsed:.1f}s elapsed")
+
+
+# Model and settings loaded once by each worker process of run_parallel
+_worker = {}
+
+
+def _init_worker(num_threads, options):
+    # Limit intra-op threads so that workers do not oversubscribe the CPU
+    torch.set_num_threads(num_threads)
+    cv2.setNumThreads(num_threads)
+    set_onnx_threads(num_threads, 1)
+    _worker["processor"], _worker["model"] = load_model()
+    _worker["options"] = options
+
+
+def _process_pair(pair, results_dir):
+    player_name, image_file = pair
+    return process_single_image(
+        player_name,
+        image_file,
+        _worker["processor"],
+        _worker["model"],
+        results_dir=results_dir,
+        verbose=False,
+        **_worker["options"],
+    )
 
-                # Calculate new dimensions based on resize_percent
-                new_width = int(width * resize_percent / 100)
-                new_height = int(height * resize_percent / 100)
 
-                # Resize image using OpenCV
-                resized = cv2.resize(
-                    original_img,
-                    (new_width, new_height),
-                    interpolation=cv2.INTER_LANCZOS4,
+def run_parallel(pairs, results_dir, workers, force=False, **options):
+    """Shard the (player, image) pairs across worker processes.
+
+    Each worker loads the model once and gets an equal share of the CPU
+    threads. ``options`` are passed on to ``process_single_image``. Returns
+    the output paths in the same order as ``pairs``.
+    """
+    outputs = {}
+    pending = []
+    for player_name, image_file in pairs:
+        output_path = get_output_path(
+            results_dir, player_name, image_file, options.get("grid", "dense")
+        )
+        # Workers load MODEL_NAME, which is also the name of its snapshot
+        metadata = sweep_settings(player_name, image_file, **options)
+        if not force and is_complete(
+            output_path, options.get("grid", "dense"), metadata
+        ):
+            print(f"{player_name}/{image_file} already complete, skipping")
+            outputs[(player_name, image_file)] = output_path
+        else:
+            pending.append((player_name, image_file))
+
+    if pending:
+        workers = min(workers, len(pending))
+        num_threads = max(1, (os.cpu_count() or 1) // workers)
+        transform_workers = options.get("transform_workers", TRANSFORM_WORKERS)
+        options["transform_workers"] = min(transform_workers, num_threads)
+        options["resume"] = not force
+        print(f"Processing {len(pending)} pairs with {workers} workers")
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(num_threads, options),
+        ) as executor:
+            futures = {
+                executor.submit(_process_pair, pair, results_dir): pair
+                for pair in pending
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                player_name, image_file = futures[future]
+                outputs[(player_name, image_file)] = future.result()
+                elapsed = time.perf_counter() - start
+                print(
+                    f"[{done}/{len(pending)}] {player_name}/{image_file} done, "
+                    f"{elapsed:.1f}s elapsed"
                 )
 
-                # Apply rotation using OpenCV
-                center = (new_width // 2, new_height // 2)
-                rotation_matrix = cv2.getRotationMatrix2D(center, degree, 1.0)
-                rotated = cv2.warpAffine(
-                    resized, rotation_matrix, (new_width, new_height)
-                )
+    return [outputs.get(pair) for pair in pairs]
 
-                # Apply dilation
-                dilated = cv2.dilate(rotated, kernel, iterations=dilation_iter)
 
-                # Get embedding for transformed image
-                transformed_embedding = get_image_embedding(dilated, processor, model)
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate transformed variations of the players' drawings and "
+        "compare them with the Canny references. Runs interactively when no "
+        "selection flag is given."
+    )
+    parser.add_argument(
+        "--all", action="store_true", help="process every available image"
+    )
+    parser.add_argument(
+        "--player", action="append", help="only process this player (repeatable)"
+    )
+    parser.add_argument(
+        "--image",
+        action="append",
+        help="only process this drawing, e.g. gato or gato.png (repeatable)",
+    )
+    parser.add_argument(
+        "--out",
+        help="results directory (default: teste_estatistico/transformation_results)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE, help="variants per forward pass"
+    )
+    parser.add_argument(
+        "--transform-workers",
+        type=int,
+        default=TRANSFORM_WORKERS,
+        help="threads producing transformed variants during inference (0 = inline)",
+    )
+    parser.add_argument(
+        "--model-resolution",
+        action="store_true",
+        help="approximate the variants directly at the model input size (faster, "
+        "see utils/benchmark_model_resolution.py for the deviation)",
+    )
+    parser.add_argument(
+        "--fast-preprocess",
+        action="store_true",
+        help="preprocess the variants with vectorized torch ops instead of PIL",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="fp32",
+        help="inference backend (see utils/benchmark_backends.py for the drift)",
+    )
+    parser.add_argument(
+        "--num-layers",
+        type=int,
+        help="read the CLS embedding after the first N encoder layers (experiments)",
+    )
+    parser.add_argument(
+        "--grid",
+        default="dense",
+        help=f"transformation grid: one of {', '.join(GRIDS)} or a JSON spec file "
+        "(see compvision/grid.py)",
+    )
+    parser.add_argument(
+        "--checkpoint-every",
+        type=int,
+        default=CHECKPOINT_EVERY,
+        help="variants embedded between two checkpoints of the results file",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="worker processes for --all/--player/--image runs, each loading the model",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="reprocess pairs whose results are already complete",
+    )
+    return parser.parse_args()
 
-                # Calculate similarity
-                similarity = calculate_cosine_similarity(
-                    canny_embedding, transformed_embedding
-                )
-                print(f"{similarity:.4f}")
 
-                results.append(f"{similarity}")
+def select_images(available_images, players=None, images=None):
+    """Filter (player, image) pairs by player names and drawing names."""
+    selected = []
+    for player_name, image_file in available_images:
+        if players and player_name not in players:
+            continue
+        if (
+            images
+            and image_file not in images
+            and os.path.splitext(image_file)[0] not in images
+        ):
+            continue
+        selected.append((player_name, image_file))
+    return selected
 
-    # Save results for this image in the player-specific transformation_results directory
-    
-    output_filename = f"transformation_results_{player_name}_{os.path.splitext(image_file)[0]}.txt"
-    
-    with open(f'./transformation_results/{image_file.split('.')[0]}/{output_filename}', "w") as f:
-        f.write("\n".join(results))
 
-    print(f"\nResults saved to {player_name}/{output_filename} in transformation_results directory")
+def main():
+    args = parse_args()
+    batch_mode = args.all or args.player or args.image
 
+    # Ensure the results directory exists
+    results_dir = args.out or ensure_results_directory()
+
+    options = {
+        "batch_size": args.batch_size,
+        "transform_workers": args.transform_workers,
+        "model_resolution": args.model_resolution,
+        "fast_preprocess": args.fast_preprocess,
+        "checkpoint_every": args.checkpoint_every,
+        "backend": args.backend,
+        "num_layers": args.num_layers,
+        "grid": args.grid,
+    }
+
+    if batch_mode:
+        pairs = select_images(get_all_available_images(), args.player, args.image)
+        if not pairs:
+            print("No images found matching the selection!")
+            return
+        if args.workers > 1:
+            run_parallel(pairs, results_dir, args.workers, args.force, **options)
+            return
 
-def main():
     # Initialize the model and processor once
-    processor = ViTImageProcessor.from_pretrained("google/vit-base-patch16-224-in21k")
-    model = ViTModel.from_pretrained("google/vit-base-patch16-224-in21k")
+    processor, model = load_model()
+    cache = EmbeddingCache()
 
-    # Ensure the results directory exists
-    ensure_results_directory()
+    if batch_mode:
+        run_batch(
+            pairs, processor, model, results_dir, args.force, cache=cache, **options
+        )
+        return
 
     while True:
         # Get all available images
@@ -165,7 +450,15 @@ def main():
             choice = int(choice)
             if 1 <= choice <= len(available_images):
                 player_name, image_file = available_images[choice - 1]
-                process_single_image(player_name, image_file, processor, model)
+                process_single_image(
+                    player_name,
+                    image_file,
+                    processor,
+                    model,
+                    cache=cache,
+                    results_dir=results_dir,
+                    **options,
+                )
             else:
                 print("Invalid choice! Please try again.")
         except ValueError:
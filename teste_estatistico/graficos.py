@@ -1,12 +1,20 @@
+import os
+import sys
+
 import matplotlib.pyplot as plt
+import numpy as np
 import seaborn as sns
 
-# Read the data from the files
-with open('/Users/marcelomarchetto/Desktop/viscomproj/teste_estatistico/transformation_results/linus/transformation_results_linus.txt', 'r') as file:
-    data = [float(line.strip()) for line in file if line.strip()]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision.results import read_results, result_path
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'transformation_results')
+
+# Read the data from the result sets
+data = np.asarray(read_results(result_path(RESULTS_DIR, 'marcelo', 'linus')).similarity)
 
-with open('/Users/marcelomarchetto/Desktop/viscomproj/teste_estatistico/transformation_results/transformation_results_enzo_raposa.txt', 'r') as file:
-    data2 = [float(line.strip()) for line in file if line.strip()]
+data2 = np.asarray(read_results(result_path(RESULTS_DIR, 'enzo', 'raposa')).similarity)
 
 # Create figure with specific size
 plt.figure(figsize=(12, 6))
@@ -1,10 +1,17 @@
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy import stats
-import itertools
 import pandas as pd
-import numpy as np
+import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision.report import RENDER_WORKERS, render_figures
+from compvision.results import discover_results, has_results
+from compvision.stats import collect_stats, result_box_stats, result_histogram, stats_ttests
 
 # Define the results directory
 RESULTS_DIR = './transformation_results'
@@ -12,96 +19,96 @@ RESULTS_DIR = './transformation_results'
 # List of all transformation result files for both star and mack
 RESULTS_DIR = os.path.join('transformation_results')
 
-# Define subdirectories for each dataset
-STAR_DIR = os.path.join(RESULTS_DIR, 'estrela')
-MACK_DIR = os.path.join(RESULTS_DIR, 'mack')
-RAPOSA_DIR = os.path.join(RESULTS_DIR, 'raposa')
-# Define subdirectories for each dataset
-
-CAVALO_DIR = os.path.join(RESULTS_DIR, 'cavalo')
-GATO_DIR = os.path.join(RESULTS_DIR, 'gato')
-LINUS_DIR = os.path.join(RESULTS_DIR, 'linus')
-LUMINARIA_DIR = os.path.join(RESULTS_DIR, 'luminaria')
-NIKE_DIR = os.path.join(RESULTS_DIR, 'nike')
-
-# List of players
-PLAYERS = ['enzo', 'marcelo', 'rafael', 'bruno']
-
-# Generate file paths for each dataset
-star_files = [os.path.join(STAR_DIR, f'transformation_results_{player}_estrela.txt') for player in PLAYERS]
-mack_files = [os.path.join(MACK_DIR, f'transformation_results_{player}_mack.txt') for player in PLAYERS]
-raposa_files = [os.path.join(RAPOSA_DIR, f'transformation_results_{player}_raposa.txt') for player in PLAYERS]
-cavalo_files = [os.path.join(CAVALO_DIR, f'transformation_results_{player}_cavalo.txt') for player in PLAYERS]
-gato_files = [os.path.join(GATO_DIR, f'transformation_results_{player}_gato.txt') for player in PLAYERS]
-linus_files = [os.path.join(LINUS_DIR, f'transformation_results_{player}_linus.txt') for player in PLAYERS]
-luminaria_files = [os.path.join(LUMINARIA_DIR, f'transformation_results_{player}_luminaria.txt') for player in PLAYERS]
-nike_files = [os.path.join(NIKE_DIR, f'transformation_results_{player}_nike.txt') for player in PLAYERS]
-
-def print_statistics(data_dict, title_prefix):
-    """Print detailed statistics for each player's data"""
+# Players and drawings are discovered from the result sets in RESULTS_DIR
+
+OUTPUT_DIR = 'resultados_estatisticos'
+
+def print_statistics(stats_dict, title_prefix):
+    """Print detailed statistics for each player's data from its OnlineStats"""
     print(f"\n{'='*80}")
     print(f"ESTATÍSTICAS DETALHADAS - {title_prefix}")
     print(f"{'='*80}")
     
-    for name, data in data_dict.items():
+    for name, summary in stats_dict.items():
         print(f"\n{name.upper()}:")
         print(f"{'-'*40}")
-        print(f"Média: {np.mean(data):.4f}")
-        print(f"Mediana: {np.median(data):.4f}")
-        print(f"Desvio Padrão: {np.std(data):.4f}")
-        print(f"Valor Mínimo: {np.min(data):.4f}")
-        print(f"Valor Máximo: {np.max(data):.4f}")
-        print(f"Quantidade de amostras: {len(data)}")
-
-def analyze_data(files, title_prefix):
-    # Dictionary to store data from each file
-    data_dict = {}
-
-    # Read data from each file
-    for file in files:
-        try:
-            with open(file, 'r') as f:
-                data = [float(line.strip()) for line in f if line.strip()]
-                name = os.path.basename(file).replace('transformation_results_', '').split('_')[0]
-                data_dict[name] = data
-        except FileNotFoundError:
-            print(f"ERRO: Arquivo não encontrado: {file}")
-            continue
-        except Exception as e:
-            print(f"ERRO ao processar arquivo {file}: {str(e)}")
-            continue
-
-    if not data_dict:
+        print(f"Média: {summary.mean:.4f}")
+        print(f"Mediana: {summary.median():.4f}")
+        print(f"Desvio Padrão: {summary.std():.4f}")
+        print(f"Valor Mínimo: {summary.min:.4f}")
+        print(f"Valor Máximo: {summary.max:.4f}")
+        print(f"Quantidade de amostras: {summary.count}")
+
+def analyze_data(stats_dict, stems, ttests, drawing, title_prefix):
+    """Print the t-tests of one drawing and return the payload of its figure.
+
+    ``stats_dict`` maps each player with results to its OnlineStats, ``stems``
+    maps (player, drawing) to the result sets and ``ttests`` holds the rows
+    of the pairwise t-test table of this drawing.
+    The histograms and box statistics of the figure are computed here, in
+    chunks, so that rendering never reads the result sets.
+    """
+    if not stats_dict:
         print(f"ERRO: Nenhum dado válido encontrado para {title_prefix}")
-        return
+        return None
+
+    # Comparisons between players that have results
+    ttests = ttests[ttests['player1'].isin(stats_dict) & ttests['player2'].isin(stats_dict)]
+    results_df = pd.DataFrame({
+        'Comparison': ttests['player1'] + ' vs ' + ttests['player2'],
+        't-statistic': ttests['t_statistic'],
+        'p-value': ttests['p_value'],
+        'p-value (%)': ttests['p_value'] * 100,
+    })
+
+    boxes = []
+    histograms = []
+    for name, summary in stats_dict.items():
+        stem = stems[name, drawing]
+        boxes.append(dict(result_box_stats(stem, summary), label=name))
+        histograms.append((name, *result_histogram(stem, 50, (summary.min, summary.max))))
+
+    base_case_stem = f'base_case/transformation_results/similarities_canny_{drawing}'
+    if has_results(base_case_stem):
+        histograms.append(('Base case', *result_histogram(base_case_stem, 10)))
 
-    # Create a DataFrame for t-test results
-    combinations = list(itertools.combinations(data_dict.keys(), 2))
-    results = []
+    # Print t-test results with formatted output
+    print(f"\n{'='*80}")
+    print(f"RESULTADOS DOS TESTES T - {title_prefix}")
+    print(f"{'='*80}")
+    
+    for comparison, t_stat, p_value in zip(results_df['Comparison'], results_df['t-statistic'], results_df['p-value']):
+        print(f"\nComparação: {comparison}")
+        print(f"{'-'*40}")
+        print(f"T-statistic: {t_stat:.6f}")
+        print(f"P-valor: {p_value * 100:.6f}%")
+        significancia = "SIGNIFICATIVO" if p_value < 0.05 else "NÃO SIGNIFICATIVO"
+        print(f"Significância: {significancia}")
+        print(f"{'-'*40}")
 
-    for (name1, name2) in combinations:
-        t_stat, p_value = stats.ttest_ind(data_dict[name1], data_dict[name2])
-        results.append({
-            'Comparison': f'{name1} vs {name2}',
-            't-statistic': t_stat,
-            'p-value': p_value,
-            'p-value (%)': p_value * 100
-        })
+    return {
+        'title': title_prefix,
+        'boxes': boxes,
+        'comparisons': list(results_df['Comparison']),
+        'p_values': results_df['p-value (%)'].to_numpy(),
+        'histograms': histograms,
+    }
 
-    # Convert results to DataFrame
-    results_df = pd.DataFrame(results)
+def render_comparison(output_file, payload):
+    """Draw and save the 3-panel comparison figure of one drawing."""
+    title_prefix = payload['title']
 
     # Create figure with subplots
     fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(12, 18))
 
     # Plot 1: Box plot of all distributions
-    data_to_plot = [data_dict[name] for name in data_dict.keys()]
-    ax1.boxplot(data_to_plot, tick_labels=list(data_dict.keys()))
+    ax1.bxp(payload['boxes'])
     ax1.set_title(f'Distribuição dos Resultados por Pessoa - {title_prefix}', fontsize=14, pad=20)
     ax1.set_ylabel('Valores', fontsize=12)
     ax1.grid(True, alpha=0.3)
 
     # Plot 2: Bar plot of p-values
+    results_df = pd.DataFrame({'Comparison': payload['comparisons'], 'p-value (%)': payload['p_values']})
     sns.barplot(data=results_df, x='Comparison', y='p-value (%)', ax=ax2)
     ax2.set_title(f'P-valores dos Testes T (%) - {title_prefix}', fontsize=14, pad=20)
     plt.setp(ax2.get_xticklabels(), rotation=45, ha='right')
@@ -110,15 +117,9 @@ def analyze_data(files, title_prefix):
     ax2.legend()
     ax2.grid(True, alpha=0.3)
 
-    # Plot 3: Distribution plot
-    for name, data in data_dict.items():
-        sns.histplot(data=data, bins=50, label=name, alpha=0.5, ax=ax3)
-    
-    
-    with open(f'base_case/transformation_results/similarities_canny_{title_prefix.lower()}.txt', 'r') as f:
-        data = [float(line.strip()) for line in f if line.strip()]
-        sns.histplot(data=data, bins=10, label='Base case', alpha=0.5, ax=ax3)
-    
+    # Plot 3: Distribution plot from the precomputed histograms
+    for name, counts, edges in payload['histograms']:
+        ax3.hist(edges[:-1], edges, weights=counts, label=name, alpha=0.5, edgecolor='black')
 
     ax3.set_title(f'Distribuição dos Resultados Estatísticos - {title_prefix}', fontsize=14, pad=20)
     ax3.set_xlabel('Valores', fontsize=12)
@@ -130,45 +131,54 @@ def analyze_data(files, title_prefix):
     # Adjust layout
     plt.tight_layout()
 
-    # Create output directory if it doesn't exist
-    output_dir = 'resultados_estatisticos'
-    os.makedirs(output_dir, exist_ok=True)
-
     # Save the plot
-    output_file = os.path.join(output_dir, f'comparacao_resultados_{title_prefix.lower()}.png')
     plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
-
-    # Print t-test results with formatted output
-    print(f"\n{'='*80}")
-    print(f"RESULTADOS DOS TESTES T - {title_prefix}")
-    print(f"{'='*80}")
-    
-    for _, row in results_df.iterrows():
-        print(f"\nComparação: {row['Comparison']}")
-        print(f"{'-'*40}")
-        print(f"T-statistic: {row['t-statistic']:.6f}")
-        print(f"P-valor: {row['p-value (%)']:.6f}%")
-        significancia = "SIGNIFICATIVO" if row['p-value'] < 0.05 else "NÃO SIGNIFICATIVO"
-        print(f"Significância: {significancia}")
-        print(f"{'-'*40}")
+    plt.close(fig)
 
-    print(f"\nGráfico salvo em: {output_file}")
+def parse_args():
+    parser = argparse.ArgumentParser(description="Análise estatística e gráficos dos resultados das transformações.")
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS,
+                        help="processos que desenham os gráficos")
+    parser.add_argument('--force', action='store_true',
+                        help="redesenha também os gráficos cujos dados não mudaram")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+
     print("\nIniciando análise estatística...")
     print(f"Diretório de resultados: {os.path.abspath(RESULTS_DIR)}")
     
-    # Analyze both star and mack data
-    analyze_data(star_files, "Estrela")
-    analyze_data(mack_files, "Mack")
-    analyze_data(raposa_files, "Raposa")
-    analyze_data(cavalo_files, "Cavalo")
-    analyze_data(gato_files, "Gato")
-    analyze_data(linus_files, "Linus")
-    analyze_data(nike_files, "Nike")
-    analyze_data(luminaria_files, "Luminaria")
-    
+    # Every result set found in one scan; new players or drawings need no
+    # code change
+    stems = discover_results(RESULTS_DIR)
+    players = sorted({player for player, _ in stems})
+    drawings = sorted({drawing for _, drawing in stems})
+    print(f"Encontrados {len(stems)} conjuntos de resultados: {len(players)} jogadores, {len(drawings)} desenhos")
+
+    # Summarize every player and drawing in one streaming pass over the
+    # results and run all the t-tests together from the summaries
+    stats = collect_stats(RESULTS_DIR, players, drawings, stems=stems)
+    ttests = stats_ttests(stats, players, drawings)
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    table_file = os.path.join(OUTPUT_DIR, 'testes_t.csv')
+    ttests.to_csv(table_file, index=False)
+    print(f"Tabela dos testes salva em: {table_file}")
+
+    figures = {}
+    for drawing in drawings:
+        title_prefix = drawing.capitalize()
+        stats_dict = {player: stats[player, drawing] for player in players if (player, drawing) in stats}
+        print_statistics(stats_dict, title_prefix)
+        payload = analyze_data(stats_dict, stems, ttests[ttests['drawing'] == drawing], drawing, title_prefix)
+        if payload is not None:
+            figures[f'comparacao_resultados_{drawing}.png'] = payload
+
+    # Only the figures whose data changed since the last run are redrawn
+    for output_file in render_figures(render_comparison, figures, OUTPUT_DIR, args.workers, args.force):
+        print(f"Gráfico salvo em: {output_file}")
+
     print("\nAnálise estatística concluída!")
 
 if __name__ == "__main__":
@@ -1,28 +1,28 @@
 import os
-import numpy as np
+import sys
 from itertools import combinations
 
-def read_transformation_results(file_path):
-    with open(file_path, 'r') as f:
-        values = [float(line.strip()) for line in f if line.strip()]
-    return values
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision.results import discover_results
+from compvision.stats import result_stats
 
 # Directory containing the transformation results
-results_dir = 'transformation_results/raposa'
+results_dir = 'transformation_results'
+drawing = 'raposa'
 
-# Get all result files
-result_files = [f for f in os.listdir(results_dir) if f.endswith('.txt')]
+# Result sets of the dense sweep of the drawing, labeled by their metadata
+stems = {player: stem for (player, name), stem in discover_results(results_dir).items() if name == drawing}
 
 # Calculate mean for each player and store in dictionary
 player_means = {}
-for file_name in result_files:
-    file_path = os.path.join(results_dir, file_name)
-    values = read_transformation_results(file_path)
-    mean_value = np.mean(values)
-    player_name = file_name.replace('transformation_results_', '').replace('_raposa.txt', '')
+for player_name, stem in stems.items():
+    # Streamed in chunks, the result set is never loaded whole
+    summary = result_stats(stem)
+    mean_value = summary.mean
     player_means[player_name] = mean_value
     print(f"\nPlayer: {player_name}")
-    print(f"Number of values: {len(values)}")
+    print(f"Number of values: {summary.count}")
     print(f"Mean: {mean_value:.6f}")
 
 # Calculate differences between all pairs of players
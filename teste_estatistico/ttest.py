@@ -1,12 +1,16 @@
+import os
+import sys
+
 import numpy as np
 from scipy import stats
 
-# Read the data from both files
-with open('transformation_results.txt', 'r') as f1:
-    data1 = np.array([float(line.strip()) for line in f1 if line.strip()])
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision.results import read_results
 
-with open('transformation_results2.txt', 'r') as f2:
-    data2 = np.array([float(line.strip()) for line in f2 if line.strip()])
+# Read the data from both result sets
+data1 = np.asarray(read_results('transformation_results').similarity)
+data2 = np.asarray(read_results('transformation_results2').similarity)
 
 # Perform t-test
 t_stat, p_value = stats.ttest_ind(data1, data2)
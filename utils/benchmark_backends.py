@@ -0,0 +1,79 @@
+"""Compare the speed and accuracy of the inference backends.
+
+Every backend embeds the Canny references of ``fotos_canny``; the drift
+against ``fp32`` and the throughput are reported, e.g.:
+
+    python utils/benchmark_backends.py --backend int8 --backend torchscript
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision import BACKENDS, check_backend, get_image_embeddings, load_model
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Drift tolerated by the robustness sweeps
+TOLERANCE = 1e-3
+
+
+def throughput(images, processor, model, backend, batch_size):
+    """Images embedded per second, after a warm-up batch."""
+    get_image_embeddings(images[:batch_size], processor, model, backend=backend)
+    start = time.perf_counter()
+    get_image_embeddings(images, processor, model, batch_size, backend=backend)
+    return len(images) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=BACKENDS,
+        help="backends to compare with fp32 (default: all)",
+    )
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument(
+        "--copies", type=int, default=4, help="times each image is embedded for timing"
+    )
+    args = parser.parse_args()
+
+    canny_dir = os.path.join(PROJECT_ROOT, "fotos_canny")
+    images = [
+        cv2.imread(os.path.join(canny_dir, name))
+        for name in sorted(os.listdir(canny_dir))
+        if name.lower().endswith((".png", ".jpg", ".jpeg"))
+    ]
+    timed = images * args.copies
+
+    processor, model = load_model()
+    reference = throughput(timed, processor, model, "fp32", args.batch_size)
+    print(f"{len(images)} Canny images, {len(timed)} embedded per timing")
+    print(f"{'fp32':<12} {reference:7.1f} img/s")
+
+    for backend in args.backend or BACKENDS[1:]:
+        try:
+            speed = throughput(timed, processor, model, backend, args.batch_size)
+            embedding_drift, similarity_drift = check_backend(
+                images, processor, model, backend, args.batch_size
+            )
+        except Exception as e:
+            print(f"{backend:<12} unavailable: {type(e).__name__}: {e}")
+            continue
+        status = "ok" if similarity_drift <= TOLERANCE else "above tolerance"
+        print(
+            f"{backend:<12} {speed:7.1f} img/s ({speed / reference:.2f}x), "
+            f"max 1-cos {embedding_drift:.2e}, "
+            f"max |dsim| {similarity_drift:.2e} ({status})"
+        )
+
+
+if __name__ == "__main__":
+    main()
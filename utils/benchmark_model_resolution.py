@@ -0,0 +1,123 @@
+"""Compare the model-resolution transform path with the exact one.
+
+For each selected (player, drawing) pair, a subsample of the transformation
+grid is generated with both paths, embedded and compared with the Canny
+reference. The script reports the deviation of the similarities and the time
+spent on the transforms, e.g.:
+
+    python utils/benchmark_model_resolution.py --player enzo --step 7
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision import (
+    EmbeddingCache,
+    generate_variations,
+    get_image_embedding,
+    get_image_embeddings,
+    load_model,
+    similarity_matrix,
+    variation_grid,
+)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def transform_time(image, grid, model_resolution):
+    """Time spent generating the variants, without keeping them in memory."""
+    start = time.perf_counter()
+    for _ in generate_variations(
+        image, grid, workers=0, model_resolution=model_resolution
+    ):
+        pass
+    return time.perf_counter() - start
+
+
+def similarities(image, grid, canny_embedding, processor, model, model_resolution):
+    variations = generate_variations(image, grid, model_resolution=model_resolution)
+    embeddings = get_image_embeddings(variations, processor, model)
+    return similarity_matrix(embeddings, canny_embedding)[:, 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--player", action="append", help="players to use (default: all)"
+    )
+    parser.add_argument(
+        "--image", action="append", help="drawings to use (default: all)"
+    )
+    parser.add_argument("--step", type=int, default=5, help="use every n-th grid point")
+    args = parser.parse_args()
+
+    processor, model = load_model()
+    cache = EmbeddingCache()
+    grid = variation_grid()[:: args.step]
+
+    players_dir = os.path.join(PROJECT_ROOT, "players")
+    canny_dir = os.path.join(PROJECT_ROOT, "fotos_canny")
+
+    deviations = []
+    exact_total = fast_total = 0.0
+    for player_name in sorted(os.listdir(players_dir)):
+        if args.player and player_name not in args.player:
+            continue
+        for image_file in sorted(os.listdir(os.path.join(players_dir, player_name))):
+            name = os.path.splitext(image_file)[0]
+            if args.image and name not in args.image and image_file not in args.image:
+                continue
+            canny_path = os.path.join(canny_dir, f"canny_{image_file}")
+            image = cv2.imread(os.path.join(players_dir, player_name, image_file))
+            canny_img = cv2.imread(canny_path)
+            if image is None or canny_img is None:
+                continue
+
+            canny_embedding = get_image_embedding(
+                canny_img, processor, model, cache=cache
+            )
+            exact_time = transform_time(image, grid, model_resolution=False)
+            fast_time = transform_time(image, grid, model_resolution=True)
+            exact_total += exact_time
+            fast_total += fast_time
+
+            exact_sims = similarities(
+                image, grid, canny_embedding, processor, model, model_resolution=False
+            )
+            fast_sims = similarities(
+                image, grid, canny_embedding, processor, model, model_resolution=True
+            )
+            deviation = np.abs(exact_sims - fast_sims)
+            deviations.append(deviation)
+
+            print(
+                f"{player_name}/{image_file}: mean |dsim| {deviation.mean():.5f}, "
+                f"max |dsim| {deviation.max():.5f}, mean shift "
+                f"{(fast_sims - exact_sims).mean():+.5f}, transforms "
+                f"{exact_time:.2f}s exact vs {fast_time:.2f}s model-resolution"
+            )
+
+    if not deviations:
+        print("No images found matching the selection!")
+        return
+
+    deviations = np.concatenate(deviations)
+    print(f"\n{len(grid)} variants per image, {len(deviations)} in total")
+    print(f"Mean |dsim|: {deviations.mean():.5f}")
+    print(f"95th percentile |dsim|: {np.percentile(deviations, 95):.5f}")
+    print(f"Max |dsim|: {deviations.max():.5f}")
+    print(
+        f"Transform time: {exact_total:.2f}s exact vs {fast_total:.2f}s "
+        f"model-resolution ({exact_total / max(fast_total, 1e-9):.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
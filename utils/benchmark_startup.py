@@ -0,0 +1,84 @@
+"""Measure the startup time of the scripts and of the model loading.
+
+Every command runs in a fresh interpreter, so the timings include Python's
+startup and all the imports, e.g.:
+
+    python utils/benchmark_startup.py --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ANALYSIS_DIR = os.path.join(PROJECT_ROOT, "teste_estatistico")
+
+sys.path.insert(0, PROJECT_ROOT)
+
+from compvision.model import snapshot_path
+
+# (label, working directory, arguments given to the interpreter)
+COMMANDS = [
+    ("python startup", PROJECT_ROOT, ["-c", "pass"]),
+    ("import compvision.results", PROJECT_ROOT, ["-c", "import compvision.results"]),
+    ("lowest_mean.py", ANALYSIS_DIR, ["lowest_mean.py"]),
+    (
+        "import compvision (all modules)",
+        PROJECT_ROOT,
+        ["-c", "import compvision.embedding, compvision.transforms"],
+    ),
+    (
+        "load_model (hub)",
+        PROJECT_ROOT,
+        ["-c", "from compvision import load_model; load_model(snapshot_dir=None)"],
+    ),
+]
+
+SNAPSHOT_COMMAND = (
+    "load_model (snapshot)",
+    PROJECT_ROOT,
+    ["-c", "from compvision import load_model; load_model()"],
+)
+
+
+def wall_time(cwd, arguments):
+    """Seconds taken by a fresh interpreter to run ``arguments``, None if it failed."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *arguments],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    if completed.returncode != 0:
+        return None
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per command")
+    args = parser.parse_args()
+
+    commands = list(COMMANDS)
+    if os.path.exists(snapshot_path()):
+        commands.append(SNAPSHOT_COMMAND)
+    else:
+        print("No model snapshot, run utils/save_model_snapshot.py to time it\n")
+
+    for label, cwd, arguments in commands:
+        times = [wall_time(cwd, arguments) for _ in range(args.repeat)]
+        if None in times:
+            print(f"{label:<35} failed")
+            continue
+        print(
+            f"{label:<35} median {statistics.median(times):6.2f}s, "
+            f"min {min(times):6.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Convert the legacy one-float-per-line result files to the binary store.
+
+The text files only hold similarities, written in grid order, so the grid
+point of every line is recovered from the sweep that produced it: the
+transformation grid for ``transformation_results_<player>_<drawing>.txt``
+and the base case grid for ``similarities_canny_<drawing>.txt``.
+
+    python utils/convert_text_results.py
+"""
+
+import glob
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision import MODEL_NAME
+from compvision.results import write_results
+from compvision.transforms import base_case_grid, variation_grid
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, "teste_estatistico", "transformation_results")
+BASE_CASE_DIR = os.path.join(
+    PROJECT_ROOT, "teste_estatistico", "base_case", "transformation_results"
+)
+
+
+def convert(text_path, grid, player, drawing):
+    similarities = np.loadtxt(text_path, dtype=np.float32, ndmin=1)
+    if len(similarities) != len(grid):
+        print(f"{text_path}: {len(similarities)} values, expected {len(grid)}")
+        return
+    stem = os.path.splitext(text_path)[0]
+    metadata = {"player": player, "drawing": drawing, "model": MODEL_NAME}
+    write_results(stem, grid, similarities, metadata)
+    print(f"Converted {text_path}")
+
+
+def main():
+    grid = variation_grid()
+    for text_path in sorted(glob.glob(os.path.join(RESULTS_DIR, "*", "*.txt"))):
+        drawing = os.path.basename(os.path.dirname(text_path))
+        name = os.path.splitext(os.path.basename(text_path))[0]
+        player = name.replace("transformation_results_", "", 1)
+        player = (
+            player[: -len(f"_{drawing}")] if player.endswith(f"_{drawing}") else player
+        )
+        convert(text_path, grid, player, drawing)
+
+    grid = base_case_grid()
+    for text_path in sorted(glob.glob(os.path.join(BASE_CASE_DIR, "*.txt"))):
+        name = os.path.splitext(os.path.basename(text_path))[0]
+        drawing = name.replace("similarities_canny_", "", 1)
+        convert(text_path, grid, "base_case", drawing)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Export the CLS output of the ViT model to ONNX and check it against PyTorch.
+
+The export is written next to the model snapshot, where the ``onnx``
+backend of ``compvision`` looks for it, e.g.:
+
+    python utils/export_onnx.py --intra-op-threads 4
+    python teste_estatistico/generate_variations_evaluate.py --all --backend onnx
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision import get_backend, get_image_embeddings, load_model
+from compvision.backends import ClsModel, export_onnx, set_onnx_threads
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Largest absolute CLS difference accepted between onnxruntime and PyTorch
+PARITY_TOLERANCE = 1e-4
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--intra-op-threads", type=int)
+    parser.add_argument("--inter-op-threads", type=int)
+    args = parser.parse_args()
+
+    processor, model = load_model()
+    path = export_onnx(model)
+    print(f"Exported {model.config._name_or_path} to {path}")
+
+    set_onnx_threads(args.intra_op_threads, args.inter_op_threads)
+    onnx_forward = get_backend(model, "onnx")
+
+    # Parity on random batches of several sizes (dynamic batch axis)
+    torch_forward = ClsModel(model)
+    size = model.config.image_size
+    max_diff = 0.0
+    for batch_size in (1, 3, 8):
+        pixel_values = torch.randn(batch_size, 3, size, size)
+        with torch.inference_mode():
+            expected = torch_forward(pixel_values).numpy()
+        actual = onnx_forward(pixel_values).numpy()
+        max_diff = max(max_diff, float(np.abs(expected - actual).max()))
+    print(f"Max |CLS difference| on random inputs: {max_diff:.2e}")
+
+    # Parity and speed on the Canny references
+    canny_dir = os.path.join(PROJECT_ROOT, "fotos_canny")
+    images = [
+        cv2.imread(os.path.join(canny_dir, name))
+        for name in sorted(os.listdir(canny_dir))
+    ]
+    timings = {}
+    embeddings = {}
+    for backend in ("fp32", "onnx"):
+        get_image_embeddings(images[:1], processor, model, backend=backend)
+        start = time.perf_counter()
+        embeddings[backend] = get_image_embeddings(
+            images, processor, model, backend=backend
+        )
+        timings[backend] = time.perf_counter() - start
+    canny_diff = float(np.abs(embeddings["fp32"] - embeddings["onnx"]).max())
+    max_diff = max(max_diff, canny_diff)
+    print(
+        f"Max |CLS difference| on fotos_canny: {canny_diff:.2e}, "
+        f"{timings['fp32']:.2f}s PyTorch vs {timings['onnx']:.2f}s onnxruntime"
+    )
+
+    if max_diff > PARITY_TOLERANCE:
+        print(f"Parity check FAILED (tolerance {PARITY_TOLERANCE:.0e})")
+        sys.exit(1)
+    print("Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Find the Canny references closest to the players' drawings.
+
+Every selected drawing is embedded and searched in the reference index of
+``fotos_canny``; with ``--method ivf`` the recall against the exact search
+is reported as well, e.g.:
+
+    python utils/nearest_reference.py --player enzo -k 3 --method ivf
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision import EmbeddingCache, embed_images, load_model
+from compvision.references import reference_index
+from compvision.search import SEARCH_METHODS
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--player", action="append", help="players to use (default: all)"
+    )
+    parser.add_argument(
+        "--image", action="append", help="drawings to use (default: all)"
+    )
+    parser.add_argument("-k", type=int, default=3, help="matches per drawing")
+    parser.add_argument("--method", choices=SEARCH_METHODS, default="exact")
+    parser.add_argument("--nprobe", type=int, default=8, help="clusters searched (ivf)")
+    args = parser.parse_args()
+
+    players_dir = os.path.join(PROJECT_ROOT, "players")
+    queries = []
+    for player_name in sorted(os.listdir(players_dir)):
+        if args.player and player_name not in args.player:
+            continue
+        for image_file in sorted(os.listdir(os.path.join(players_dir, player_name))):
+            name = os.path.splitext(image_file)[0]
+            if args.image and name not in args.image and image_file not in args.image:
+                continue
+            queries.append((player_name, image_file))
+    if not queries:
+        print("No images found matching the selection!")
+        return
+
+    processor, model = load_model()
+    cache = EmbeddingCache()
+    references = reference_index(processor, model, cache=cache)
+    embeddings = embed_images(
+        [os.path.join(players_dir, *query) for query in queries],
+        processor,
+        model,
+        cache=cache,
+    )
+
+    options = {"nprobe": args.nprobe} if args.method == "ivf" else {}
+    search = references.searcher(args.method, **options)
+    similarities, rows = search.search(embeddings, args.k)
+
+    hits = 0
+    for (player_name, image_file), query_rows, query_similarities in zip(
+        queries, rows, similarities
+    ):
+        matches = ", ".join(
+            f"{references.names[row]} ({similarity:.4f})"
+            for row, similarity in zip(query_rows, query_similarities)
+            if row >= 0
+        )
+        print(f"{player_name}/{image_file}: {matches}")
+        hits += os.path.splitext(image_file)[0] == references.names[query_rows[0]]
+
+    print(f"\nTop-1 is the drawing's own reference for {hits}/{len(queries)} drawings")
+    if args.method != "exact":
+        _, exact_rows = references.searcher().search(embeddings, args.k)
+        recall = sum(
+            len(set(approximate) & set(exact)) / len(exact)
+            for approximate, exact in zip(rows, exact_rows)
+        ) / len(queries)
+        print(f"Recall@{args.k} against the exact search: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
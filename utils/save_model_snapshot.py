@@ -0,0 +1,32 @@
+"""Save a local safetensors snapshot of the ViT model for offline loading.
+
+``compvision.load_model`` reads the snapshot instead of the Hugging Face hub
+once it exists, e.g.:
+
+    python utils/save_model_snapshot.py
+    HF_HUB_OFFLINE=1 python teste_estatistico/generate_variations_evaluate.py --all
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision.model import DEFAULT_SNAPSHOT_DIR, MODEL_NAME, save_snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=MODEL_NAME, help="hub id of the model")
+    parser.add_argument(
+        "--dir", default=DEFAULT_SNAPSHOT_DIR, help="directory of the snapshots"
+    )
+    args = parser.parse_args()
+
+    path = save_snapshot(args.model, args.dir)
+    print(f"Snapshot of {args.model} saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,56 @@
-import os
-import cv2 as cv
-import numpy as np
-
-input_folder = '../fotos'
-output_folder = '../fotos_canny'
-
-os.makedirs(output_folder, exist_ok=True)
-
-kernel = np.ones((3, 3), np.uint8)
-
-# Supported image extensions
-image_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.tiff')
-
-# Loop through all files in the input folder
-for filename in os.listdir(input_folder):
-    if filename.lower().endswith(image_extensions):
+"""Generate the Canny references of the photos in ``fotos`` into ``fotos_canny``.
 
-        input_path = os.path.join(input_folder, filename)
-        output_path = os.path.join(output_folder, f'canny_{filename}')
+Only photos that changed since the last run (or whose parameters changed)
+are processed, in a thread pool, e.g.:
 
-        img = cv.imread(input_path, cv.IMREAD_GRAYSCALE)
+    python utils/transform_to_canny.py --low 100 --high 200 --kernel-size 3
+"""
 
-        if img is None:
-            print(f"Could not read image: {input_path}")
-            continue
-
-        edges = cv.Canny(img, 100, 200)
-
-        edges_dilated = cv.dilate(edges, kernel, iterations=1)
-
-        # Invert black and white colors of the Canny output
-        edges_inverted = cv.bitwise_not(edges_dilated)
-
-        cv.imwrite(output_path, edges_inverted)
-        print(f"Saved: {output_path}")
\ No newline at end of file
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compvision.canny import (
+    DILATION_ITERATIONS,
+    HIGH_THRESHOLD,
+    KERNEL_SIZE,
+    LOW_THRESHOLD,
+    canny_references,
+)
+from compvision.pipeline import TRANSFORM_WORKERS
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--input", default=os.path.join(PROJECT_ROOT, "fotos"))
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "fotos_canny"))
+    parser.add_argument("--low", type=int, default=LOW_THRESHOLD)
+    parser.add_argument("--high", type=int, default=HIGH_THRESHOLD)
+    parser.add_argument("--kernel-size", type=int, default=KERNEL_SIZE)
+    parser.add_argument("--iterations", type=int, default=DILATION_ITERATIONS)
+    parser.add_argument("--workers", type=int, default=TRANSFORM_WORKERS)
+    parser.add_argument(
+        "--force", action="store_true", help="recompute unchanged photos too"
+    )
+    args = parser.parse_args()
+
+    _, computed = canny_references(
+        args.input,
+        args.output,
+        workers=args.workers,
+        force=args.force,
+        low_threshold=args.low,
+        high_threshold=args.high,
+        kernel_size=args.kernel_size,
+        iterations=args.iterations,
+    )
+    for name in computed:
+        print(f"Saved: {os.path.join(args.output, name)}")
+
+
+if __name__ == "__main__":
+    main()